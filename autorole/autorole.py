@@ -1,3 +1,8 @@
+import asyncio
+import collections
+import heapq
+import time
+
 import discord
 from discord.ext import commands
 
@@ -15,45 +20,472 @@ class Autorole(commands.Cog):
 
         self.db = self.bot.api.get_plugin_partition(self)
 
+        self.role_ids = []
+
+        self.joins = asyncio.Queue()
+        self.workers = []
+        self.latencies = collections.deque(maxlen=100)
+
+        self.job = None
+        self.job_task = None
+        self.job_workers = 4
+
+        self.delay = 0
+        self.screening = False
+
+        self.scheduled = {}
+        self.deadlines = []
+        self.wakeup = asyncio.Event()
+        self.scheduler = None
+
+    async def cog_load(self):
+        await self.load_config()
+
+        self.workers = [
+            asyncio.create_task(self.assign_roles()) for _ in range(3)
+        ]
+
+        asyncio.create_task(self.resume_job())
+
+        documents = await self.db.find({"type": "join"}).to_list(None)
+
+        for document in documents:
+            self.scheduled[document["member_id"]] = document["due"]
+            self.deadlines.append((document["due"], document["member_id"]))
+
+        heapq.heapify(self.deadlines)
+
+        self.scheduler = asyncio.create_task(self.release_joins())
+
+    async def cog_unload(self):
+        for worker in self.workers:
+            worker.cancel()
+
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+
+        if self.job_task is not None:
+            self.job_task.cancel()
+
+    async def load_config(self):
+        """Function that loads the configured roles into memory.
+
+        It looks for an autorole configuration file in the database.
+        The cached roles are updated by the `autorole set` and
+        `autorole clear` commands, so the file is only read once.
+        """
+        self.role_ids = []
+
+        config = await self.db.find_one({"_id": "autorole-config"})
+
+        if not config:
+            return
+
+        self.job_workers = config.get("workers", 4)
+        self.delay = config.get("delay", 0)
+        self.screening = config.get("screening", False)
+
+        # settings commands can create the file before any roles are set
+        role_ids = config.get("roles", [])
+
+        if not isinstance(role_ids, list):
+            return logger.error(
+                "Something went wrong in the database! The `roles` field "
+                "in the configuration file has an invalid format."
+            )
+
+        self.role_ids = role_ids
+
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         """Function that executes when a member joins a server.
 
-        It looks for an autorole configuration file in the database. If
-        one is found, the conigured set of roles will be assigned to
-        the new member.
+        If any roles are configured, the new member is queued to have
+        them assigned. The queue is drained by a few workers, so a burst
+        of joins does not pile up behind the rate limiter all at once.
+
+        When a delay is configured, or when members have to complete
+        membership screening first, the member is scheduled instead.
         """
         if member.guild.id != self.bot.guild_id:
             return
 
-        config = await self.db.find_one({"_id": "autorole-config"})
+        if not self.role_ids:
+            return
 
-        if not config:
+        if self.delay or (self.screening and member.pending):
+            due = time.time() + self.delay
+
+            return await self.schedule_join(member.id, due)
+
+        self.joins.put_nowait((member, time.perf_counter()))
+
+    @commands.Cog.listener()
+    async def on_member_update(
+        self, before: discord.Member, after: discord.Member
+    ):
+        """Function that executes when a member is updated.
+
+        Scheduled members of which the delay has passed are released as
+        soon as they complete membership screening.
+        """
+        if not before.pending or after.pending:
+            return
+
+        due = self.scheduled.get(after.id)
+
+        if due is not None and due <= time.time():
+            await self.release_join(after.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        """Function that executes when a member leaves a server."""
+
+        if member.id in self.scheduled:
+            del self.scheduled[member.id]
+            await self.db.delete_one({"_id": f"join-{member.id}"})
+
+    async def schedule_join(self, member_id: int, due: float):
+        """Persist a join and push it onto the scheduler."""
+
+        await self.db.update_one(
+            {"_id": f"join-{member_id}"},
+            {"$set": {"type": "join", "member_id": member_id, "due": due}},
+            upsert=True,
+        )
+
+        self.scheduled[member_id] = due
+
+        if not self.deadlines or due < self.deadlines[0][0]:
+            self.wakeup.set()
+
+        heapq.heappush(self.deadlines, (due, member_id))
+
+    async def release_join(self, member_id: int):
+        """Queue a scheduled member to have the roles assigned."""
+
+        del self.scheduled[member_id]
+
+        member = self.bot.guild.get_member(member_id)
+
+        if member is not None:
+            self.joins.put_nowait((member, time.perf_counter()))
+        else:
+            logger.debug(f"Scheduled member {member_id} left the server.")
+
+        await self.db.delete_one({"_id": f"join-{member_id}"})
+
+    async def release_joins(self):
+        """Function that releases scheduled members once they are due.
+
+        The scheduled members are kept on a heap, ordered by the time at
+        which they are due, so it only has to sleep until the earliest
+        one. Members that are still in membership screening stay
+        scheduled until `on_member_update` notices they completed it.
+        """
+        await self.bot.wait_until_ready()
+
+        while True:
+            self.wakeup.clear()
+
+            timeout = None
+
+            if self.deadlines:
+                timeout = max(self.deadlines[0][0] - time.time(), 0)
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            now = time.time()
+
+            while self.deadlines and self.deadlines[0][0] <= now:
+                due, member_id = heapq.heappop(self.deadlines)
+
+                if self.scheduled.get(member_id) != due:
+                    continue  # released or rescheduled in the meantime
+
+                member = self.bot.guild.get_member(member_id)
+
+                if member is not None and self.screening and member.pending:
+                    continue
+
+                try:
+                    await self.release_join(member_id)
+                except Exception:
+                    logger.error(
+                        f"Could not release scheduled member {member_id}.",
+                        exc_info=True,
+                    )
+
+    async def assign_roles(self):
+        """Function that assigns the configured roles to new members."""
+
+        while True:
+            member, queued_at = await self.joins.get()
+
+            try:
+                roles = [
+                    role
+                    for role_id in self.role_ids
+                    if (role := member.guild.get_role(role_id))
+                ]
+
+                if roles:
+                    await member.add_roles(*roles)
+
+                logger.debug(f"Added configured roles to new member {member}.")
+            except discord.HTTPException as e:
+                logger.warning(
+                    f"Could not add configured roles to new member {member} "
+                    f"({e})."
+                )
+            finally:
+                self.latencies.append(time.perf_counter() - queued_at)
+                self.joins.task_done()
+
+    async def resume_job(self):
+        """Function that gets invoked whenever this plugin is loaded.
+
+        It looks for a checkpoint of a bulk job in the database. If one
+        is found, the job is resumed where it left off.
+        """
+        await self.bot.wait_until_ready()
+
+        job = await self.db.find_one({"_id": "autorole-job"})
+
+        if job is None:
             return
 
+        logger.info(f"Resuming the bulk job at {job['done']} member(s).")
+
+        self.job = job
+        self.job_task = asyncio.create_task(self.run_job(job))
+
+    async def start_job(self, ctx: commands.Context, job: dict, dry_run: bool):
+        """Checkpoint a new bulk job and start running it.
+
+        The affected members are computed once, up front. A dry run only
+        reports how many members would be affected.
+        """
+        if self.job is not None:
+            return await ctx.send("Another bulk job is already running.")
+
+        members = self.job_targets(ctx.guild, job)
+
+        job["total"] = len(members)
+        job["dry_run"] = dry_run
+
+        if dry_run:
+            return await ctx.send(embed=self.job_embed(job))
+
+        # reserve the slot before awaiting, so no other job can start
+        self.job = job
+
         try:
-            role_ids = config["roles"]
-        except KeyError:
-            return logger.error(
-                "Something went wrong in the database! The `roles` field "
-                "could not be found in the configuration file."
+            message = await ctx.send(embed=self.job_embed(job))
+
+            job.update(
+                {
+                    "_id": "autorole-job",
+                    "guild_id": ctx.guild.id,
+                    "channel_id": ctx.channel.id,
+                    "message_id": message.id,
+                    "done": 0,
+                    "failed": 0,
+                }
             )
 
-        if not isinstance(role_ids, list):
-            return logger.error(
-                "Something went wrong in the database! The `roles` field "
-                "in the configuration file has an invalid format."
+            await self.db.replace_one(
+                {"_id": "autorole-job"}, job, upsert=True
             )
+        except BaseException:
+            self.job = None
+            raise
 
-        roles = [
-            role
-            for role_id in role_ids
-            if (role := member.guild.get_role(role_id))
-        ]
+        self.job_task = asyncio.create_task(self.run_job(job, members))
+
+    def job_targets(self, guild: discord.Guild, job: dict) -> list:
+        """Find the members that still need to be updated by a job.
+
+        Members that should lose a role are exactly its current holders.
+        For members that should get a role, the holders are collected
+        in a set once, so each member is checked in constant time.
+        """
+        role = guild.get_role(job["role_id"])
+
+        if role is None:
+            return []
+
+        if job["action"] in ("take", "swap"):
+            return role.members
+
+        holders = {member.id for member in role.members}
+
+        return [member for member in guild.members if member.id not in holders]
+
+    async def apply_job(self, job: dict, member: discord.Member):
+        """Update a single member with one API call."""
+
+        if job["action"] == "give":
+            await member.add_roles(discord.Object(job["role_id"]))
+        elif job["action"] == "take":
+            await member.remove_roles(discord.Object(job["role_id"]))
+        else:
+            roles = [
+                role
+                for role in member.roles
+                if role.id not in (job["role_id"], job["new_role_id"])
+                and not role.is_default()
+            ]
+            roles.append(discord.Object(job["new_role_id"]))
+
+            await member.edit(roles=roles)
+
+    def job_embed(self, job: dict, eta: float = None) -> discord.Embed:
+        """Build the embed that reports the progress of a bulk job."""
+
+        embed = discord.Embed(title="Autorole", color=self.bot.main_color)
 
-        await member.add_roles(*roles)
+        s = "" if job["total"] == 1 else "s"
 
-        logger.debug(f"Added configured roles to new member {member}.")
+        if job["action"] == "give":
+            embed.description = (
+                f"Adding <@&{job['role_id']}> to {job['total']} member{s}!\n"
+            )
+        elif job["action"] == "take":
+            embed.description = (
+                f"Removing <@&{job['role_id']}> from {job['total']} "
+                f"member{s}!\n"
+            )
+        else:
+            embed.description = (
+                f"Moving {job['total']} member{s} from <@&{job['role_id']}> "
+                f"to <@&{job['new_role_id']}>!\n"
+            )
+
+        if "done" in job:
+            embed.description += f"Progress: {job['done']}/{job['total']}"
+
+            if job["failed"]:
+                embed.description += f" ({job['failed']} failed)"
+
+            if eta is not None:
+                embed.description += f"\nTime remaining: about {eta:.0f}s"
+        elif job.get("dry_run"):
+            embed.description += "This is a dry run, nobody will be updated."
+        else:
+            embed.description += (
+                "Please note that this operation could take a while."
+            )
+
+        return embed
+
+    async def run_job(self, job: dict, members: list = None):
+        """Function that runs a bulk job with a few concurrent workers.
+
+        The members to update are computed again whenever the job is
+        resumed, so members that were already updated are skipped.
+        Every five seconds, the progress is saved in the database and
+        shown in the progress message.
+        """
+        guild = self.bot.get_guild(job["guild_id"])
+        channel = self.bot.get_channel(job["channel_id"])
+
+        message = None
+
+        if channel is not None:
+            message = channel.get_partial_message(job["message_id"])
+
+        if members is None:
+            members = self.job_targets(guild, job) if guild else []
+
+        job["total"] = job["done"] + len(members)
+
+        pending = iter(members)
+
+        async def worker():
+            for member in pending:
+                try:
+                    await self.apply_job(job, member)
+                except discord.HTTPException:
+                    job["failed"] += 1
+
+                job["done"] += 1
+
+        start = time.perf_counter()
+        done_at_start = job["done"]
+
+        workers = asyncio.gather(
+            *(worker() for _ in range(self.job_workers))
+        )
+
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(workers), 5)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+
+                rate = (job["done"] - done_at_start) / (
+                    time.perf_counter() - start
+                )
+                eta = (job["total"] - job["done"]) / rate if rate else None
+
+                await self.db.update_one(
+                    {"_id": "autorole-job"},
+                    {"$set": {"done": job["done"], "failed": job["failed"]}},
+                )
+
+                if message is None:
+                    continue
+
+                try:
+                    await message.edit(embed=self.job_embed(job, eta))
+                except discord.NotFound:
+                    message = None
+                except discord.HTTPException:
+                    pass
+        except asyncio.CancelledError:
+            if job.get("cancelled"):
+                await self.finish_job(job, message)
+
+            raise
+        else:
+            await self.finish_job(job, message)
+        finally:
+            # on errors the checkpoint is kept, so the job is resumed the
+            # next time the plugin loads, but new jobs aren't blocked
+            workers.cancel()
+
+            if self.job is job:
+                self.job = None
+                self.job_task = None
+
+    async def finish_job(self, job: dict, message: discord.PartialMessage):
+        """Remove the checkpoint of a bulk job and report its result."""
+
+        await self.db.delete_one({"_id": "autorole-job"})
+
+        self.job = None
+        self.job_task = None
+
+        if message is None:
+            return
+
+        embed = self.job_embed(job)
+
+        if job.get("cancelled"):
+            embed.description += "\nThis job was cancelled."
+        else:
+            embed.description += "\nThis job has finished."
+
+        try:
+            await message.edit(embed=embed)
+        except discord.HTTPException:
+            pass
 
     @commands.group(name="autorole", invoke_without_command=True)
     @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
@@ -72,18 +504,17 @@ class Autorole(commands.Cog):
         if not roles:
             return await ctx.send_help(ctx.command)
 
-        config = await self.db.find_one({"_id": "autorole-config"})
-
-        if not config:
-            await self.db.insert_one({"_id": "autorole-config"})
-
         role_ids = [role.id for role in roles]
         role_mentions = [role.mention for role in roles]
 
-        await self.db.find_one_and_update(
-            {"_id": "autorole-config"}, {"$set": {"roles": role_ids}}
+        await self.db.update_one(
+            {"_id": "autorole-config"},
+            {"$set": {"roles": role_ids}},
+            upsert=True,
         )
 
+        self.role_ids = role_ids
+
         embed = discord.Embed(title="Autorole", color=self.bot.main_color)
 
         embed.description = (
@@ -95,33 +526,116 @@ class Autorole(commands.Cog):
 
     @autorole.command(name="give")
     @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
-    async def autorole_give(self, ctx: commands.Context, role: discord.Role):
-        """Assign a role to all current members of the server."""
+    async def autorole_give(
+        self, ctx: commands.Context, role: discord.Role, dry_run: bool = False
+    ):
+        """Assign a role to all current members of the server.
 
-        members = [
-            member
-            for member in ctx.guild.members
-            if member not in role.members
-        ]
+        This runs as a job in the background, which is resumed when the
+        bot restarts. Use `autorole status` to view its progress.
+        """
 
-        s = "" if len(members) == 1 else "s"
+        job = {"action": "give", "role_id": role.id}
 
-        embed = discord.Embed(title="Autorole", color=self.bot.main_color)
+        await self.start_job(ctx, job, dry_run)
 
-        embed.description = (
-            f"Adding {role.mention} to {len(members)} member{s}!\n"
-            "Please note that this operation could take a while."
+    @autorole.command(name="take")
+    @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
+    async def autorole_take(
+        self, ctx: commands.Context, role: discord.Role, dry_run: bool = False
+    ):
+        """Remove a role from all current members of the server.
+
+        This runs as a job in the background, which is resumed when the
+        bot restarts. Use `autorole status` to view its progress.
+        """
+
+        job = {"action": "take", "role_id": role.id}
+
+        await self.start_job(ctx, job, dry_run)
+
+    @autorole.command(name="swap")
+    @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
+    async def autorole_swap(
+        self,
+        ctx: commands.Context,
+        old_role: discord.Role,
+        new_role: discord.Role,
+        dry_run: bool = False,
+    ):
+        """Move all members from one role to another.
+
+        Each member is updated with a single API call. This runs as a
+        job in the background, which is resumed when the bot restarts.
+        Use `autorole status` to view its progress.
+        """
+
+        if old_role == new_role:
+            raise commands.BadArgument("Both roles should be different.")
+
+        job = {
+            "action": "swap",
+            "role_id": old_role.id,
+            "new_role_id": new_role.id,
+        }
+
+        await self.start_job(ctx, job, dry_run)
+
+    @autorole.command(name="status")
+    @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
+    async def autorole_status(self, ctx: commands.Context):
+        """View the progress of the running bulk job."""
+
+        if self.job is None:
+            return await ctx.send("There is no bulk job running.")
+
+        await ctx.send(embed=self.job_embed(self.job))
+
+    @autorole.command(name="cancel")
+    @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
+    async def autorole_cancel(self, ctx: commands.Context):
+        """Cancel the running bulk job."""
+
+        if self.job is None:
+            return await ctx.send("There is no bulk job running.")
+
+        if self.job_task is None:
+            return await ctx.send("The bulk job is still starting.")
+
+        self.job["cancelled"] = True
+        self.job_task.cancel()
+
+        embed = discord.Embed(
+            title="Autorole",
+            description="The bulk job has been cancelled.",
+            color=self.bot.main_color,
         )
 
         await ctx.send(embed=embed)
 
-        for member in members:
-            await member.add_roles(role)
+    @autorole.command(name="workers")
+    @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
+    async def autorole_workers(self, ctx: commands.Context, amount: int):
+        """Set how many members a bulk job updates at the same time."""
+
+        if amount < 1:
+            raise commands.BadArgument(
+                "The amount of workers should be a strictly positive "
+                f"integer, not `{amount}`."
+            )
+
+        await self.db.update_one(
+            {"_id": "autorole-config"},
+            {"$set": {"workers": amount}},
+            upsert=True,
+        )
+
+        self.job_workers = amount
 
         embed = discord.Embed(
             title="Autorole",
-            description=f"Added {role.mention} to {len(members)} member{s}!",
-            colour=self.bot.main_color,
+            description=f"Bulk jobs will now use {amount} workers.",
+            color=self.bot.main_color,
         )
 
         await ctx.send(embed=embed)
@@ -137,17 +651,100 @@ class Autorole(commands.Cog):
             color=self.bot.main_color,
         )
 
-        config = await self.db.find_one({"_id": "autorole-config"})
-
-        if not config:
-            return await ctx.send(embed=embed)
+        self.role_ids = []
 
-        await self.db.find_one_and_update(
+        await self.db.update_one(
             {"_id": "autorole-config"}, {"$set": {"roles": []}}
         )
 
         await ctx.send(embed=embed)
 
+    @autorole.command(name="delay")
+    @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
+    async def autorole_delay(self, ctx: commands.Context, seconds: int):
+        """Set how long to wait before assigning roles to new members."""
+
+        if seconds < 0:
+            raise commands.BadArgument(
+                "The delay should be a positive integer, not "
+                f"`{seconds}`."
+            )
+
+        await self.db.update_one(
+            {"_id": "autorole-config"},
+            {"$set": {"delay": seconds}},
+            upsert=True,
+        )
+
+        self.delay = seconds
+
+        embed = discord.Embed(
+            title="Autorole",
+            description=(
+                f"Roles will be assigned {seconds} seconds after new server "
+                "members join."
+            ),
+            color=self.bot.main_color,
+        )
+
+        await ctx.send(embed=embed)
+
+    @autorole.command(name="screening")
+    @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
+    async def autorole_screening(self, ctx: commands.Context, enabled: bool):
+        """Wait for new members to complete membership screening."""
+
+        await self.db.update_one(
+            {"_id": "autorole-config"},
+            {"$set": {"screening": enabled}},
+            upsert=True,
+        )
+
+        self.screening = enabled
+
+        embed = discord.Embed(title="Autorole", color=self.bot.main_color)
+
+        if enabled:
+            embed.description = (
+                "Roles will be assigned once new server members complete "
+                "membership screening."
+            )
+        else:
+            embed.description = (
+                "Roles will be assigned regardless of membership screening."
+            )
+
+        await ctx.send(embed=embed)
+
+    @autorole.command(name="queue")
+    @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
+    async def autorole_queue(self, ctx: commands.Context):
+        """View how many new members are waiting for their roles."""
+
+        size = self.joins.qsize()
+        s = "" if size == 1 else "s"
+
+        embed = discord.Embed(title="Autorole", color=self.bot.main_color)
+
+        embed.description = f"{size} new member{s} waiting for roles."
+
+        if self.scheduled:
+            embed.description += (
+                f"\n{len(self.scheduled)} new member(s) scheduled for later."
+            )
+
+        if self.latencies:
+            average = sum(self.latencies) / len(self.latencies)
+
+            embed.description += (
+                f"\nDrain latency of the last {len(self.latencies)} "
+                f"member{'' if len(self.latencies) == 1 else 's'}: "
+                f"{average:.2f}s on average, {max(self.latencies):.2f}s at "
+                "most."
+            )
+
+        await ctx.send(embed=embed)
+
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Autorole(bot))
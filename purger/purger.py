@@ -1,22 +1,592 @@
+import asyncio
+import datetime
+import gzip
+import json
+import re
+import tempfile
+import time
+from typing import Callable, Optional, Union
+
 import discord
 from discord.ext import commands
+from pymongo.errors import PyMongoError
 
 from core import checks
 from core.models import PermissionLevel, getLogger
 
 logger = getLogger(__name__)
 
+LINK_REGEX = re.compile(r"https?://\S+")
+
+MESSAGE_LINK_REGEX = re.compile(
+    r"https?://(?:\w+\.)?discord(?:app)?\.com/channels/\d+/\d+/(\d+)"
+)
+TIMESTAMP_REGEX = re.compile(r"<t:(-?\d+)(?::[tTdDfFR])?>")
+
+CHUNK_TASKS = 2
+OLD_WORKERS = 3
+OLD_QUEUE_SIZE = 100
+CHANNEL_WORKERS = 5
+
+REPORT_LIMIT = 4000
+
+# documents are limited to 16 MB, with some room for the other fields
+ARCHIVE_LIMIT = 15 * 1024 * 1024
+# gzip buffers some data before it reaches the file
+ARCHIVE_MARGIN = 1024 * 1024
+# compression runs on the event loop, so it is kept cheap
+ARCHIVE_COMPRESSION = 6
+
+
+class PurgeFlags(commands.FlagConverter):
+    """Filters to only purge certain messages."""
+
+    user: Optional[discord.User] = None
+    bots: bool = False
+    regex: Optional[str] = None
+    attachments: bool = False
+    links: bool = False
+    before: Optional[discord.Object] = None
+    after: Optional[discord.Object] = None
+    scan: int = 1000
+    archive: bool = False
+
+
+class Bound(commands.Converter):
+    """Converts a message ID, a message link or a timestamp to a snowflake.
+
+    Timestamps can be Discord timestamps, Unix timestamps in seconds or
+    milliseconds, or ISO 8601 dates, which are assumed to be in UTC
+    without a timezone. Bounds in the future are rejected.
+    """
+
+    async def convert(
+        self, ctx: commands.Context, argument: str
+    ) -> discord.Object:
+        for regex in (MESSAGE_LINK_REGEX, TIMESTAMP_REGEX):
+            match = regex.fullmatch(argument)
+
+            if match:
+                argument = match.group(1)
+
+        try:
+            value = int(argument)
+        except ValueError:
+            try:
+                date = datetime.datetime.fromisoformat(argument)
+            except ValueError:
+                raise commands.BadArgument(
+                    f"`{argument}` is not a message ID, a message link or "
+                    "a timestamp."
+                )
+
+            if date.tzinfo is None:
+                date = date.replace(tzinfo=datetime.timezone.utc)
+
+            snowflake = discord.utils.time_snowflake(date)
+        else:
+            # message IDs are a lot larger than Unix timestamps, even in
+            # milliseconds
+            if value >= 2**42:
+                snowflake = value
+            else:
+                if value >= 2**32:
+                    value /= 1000
+
+                try:
+                    date = datetime.datetime.fromtimestamp(
+                        value, tz=datetime.timezone.utc
+                    )
+                except (OverflowError, OSError, ValueError):
+                    raise commands.BadArgument(
+                        f"`{argument}` is not a valid timestamp."
+                    )
+
+                snowflake = discord.utils.time_snowflake(date)
+
+        now = discord.utils.time_snowflake(discord.utils.utcnow(), high=True)
+
+        if snowflake > now:
+            raise commands.BadArgument(f"`{argument}` is in the future.")
+
+        return discord.Object(id=snowflake)
+
 
 class Purger(commands.Cog):
     """Plugin to delete multiple messages at once."""
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.db = self.bot.api.get_plugin_partition(self)
+
+        self.jobs = {}
+
+    def build_check(self, flags: PurgeFlags) -> Callable:
+        """Build a function that checks a message against the filters."""
+
+        try:
+            pattern = re.compile(flags.regex) if flags.regex else None
+        except re.error as e:
+            raise commands.BadArgument(
+                f"The regular expression `{flags.regex}` is invalid: {e}."
+            )
+
+        def check(message: discord.Message) -> bool:
+            if flags.user and message.author.id != flags.user.id:
+                return False
+
+            if flags.bots and not message.author.bot:
+                return False
+
+            if pattern and not pattern.search(message.content):
+                return False
+
+            if flags.attachments and not message.attachments:
+                return False
+
+            if flags.links and not LINK_REGEX.search(message.content):
+                return False
+
+            return True
+
+        return check
+
+    async def purge_channel(
+        self,
+        channel: discord.TextChannel,
+        job: dict,
+        amount: Optional[int],
+        check: Callable,
+        limit: Optional[int],
+        before: discord.abc.Snowflake,
+        after: Optional[discord.abc.Snowflake],
+    ):
+        """Function that deletes the matching messages in a channel.
+
+        The history of the channel is streamed, and matching messages
+        are split by the age of their snowflake. Recent messages are
+        collected in chunks of 100, and each chunk is bulk deleted while
+        the history is still being scanned. Only a couple of chunks are
+        in flight at once, the scan waits for the oldest one otherwise,
+        so memory doesn't grow with the size of the purge. Messages
+        older than 14 days can't be bulk deleted, so those are handed
+        to a small pool of workers that delete them one by one. Their
+        queue is bounded, so the scan slows down to match the workers.
+
+        At most `limit` messages are scanned, so a filter that rarely
+        matches doesn't walk the entire channel. Without a limit or an
+        amount, the scan stops at the `after` boundary instead. The
+        counts are kept in `job`, and the purge stops early when it is
+        cancelled.
+        """
+        # chunks can wait on the rate limit, so messages that are close
+        # to the limit are deleted one by one as well
+        cutoff = discord.utils.time_snowflake(
+            discord.utils.utcnow() - datetime.timedelta(days=13, hours=23)
+        )
+
+        chunk = []
+        tasks = []
+
+        queue = asyncio.Queue(maxsize=OLD_QUEUE_SIZE)
+        workers = [
+            asyncio.create_task(self.delete_old(queue, job))
+            for _ in range(OLD_WORKERS)
+        ]
+
+        history = channel.history(
+            limit=limit, before=before, after=after, oldest_first=False
+        )
+
+        try:
+            async for message in history:
+                if job["cancel"].is_set():
+                    break
+
+                if not check(message):
+                    continue
+
+                if message.id < cutoff:
+                    await queue.put(message)
+                else:
+                    chunk.append(message)
+
+                if len(chunk) == 100:
+                    if len(tasks) >= CHUNK_TASKS:
+                        await tasks.pop(0)
+
+                    tasks.append(
+                        asyncio.create_task(self.delete_chunk(chunk, job))
+                    )
+                    chunk = []
+
+                job["matched"] += 1
+
+                if amount is not None and job["matched"] >= amount:
+                    break
+
+            if chunk:
+                tasks.append(
+                    asyncio.create_task(self.delete_chunk(chunk, job))
+                )
+        finally:
+            job["scanning"] = False
+
+            for _ in workers:
+                await queue.put(None)
+
+            results = await asyncio.gather(
+                *tasks, *workers, return_exceptions=True
+            )
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    def archive_message(self, archive: dict, message: discord.Message):
+        """Write a deleted message to an archive as a line of JSON.
+
+        Messages are only archived once their deletion succeeded, so the
+        archive never lists messages that were skipped, for instance
+        after a cancel. Once the current part of the archive is close to
+        the size limit, it is closed and a new part is started.
+        """
+
+        data = {
+            "id": message.id,
+            "channel_id": message.channel.id,
+            "author": {"id": message.author.id, "name": str(message.author)},
+            "content": message.content,
+            "attachments": [a.url for a in message.attachments],
+            "created_at": message.created_at.isoformat(),
+            "edited_at": message.edited_at and message.edited_at.isoformat(),
+        }
+
+        archive["writer"].write(json.dumps(data).encode() + b"\n")
+        archive["count"] += 1
+
+        if archive["file"].tell() >= archive["limit"] - ARCHIVE_MARGIN:
+            self.rotate_archive(archive)
+
+    def open_archive(self) -> dict:
+        """Function that opens a new archive.
+
+        The archive is compressed while it is written to temporary
+        files, so the messages never have to be held in memory. It is
+        split in parts that can each be uploaded to the log channel, or
+        stored in a single document.
+        """
+        limit = ARCHIVE_LIMIT
+        channel = self.bot.log_channel
+
+        if channel is not None:
+            limit = min(limit, channel.guild.filesize_limit)
+
+        archive = {"parts": [], "limit": limit}
+        self.start_archive_part(archive)
+
+        return archive
+
+    def start_archive_part(self, archive: dict):
+        """Start a new part of an archive."""
+
+        archive["file"] = tempfile.TemporaryFile()
+        archive["writer"] = gzip.GzipFile(
+            fileobj=archive["file"],
+            mode="wb",
+            compresslevel=ARCHIVE_COMPRESSION,
+        )
+        archive["count"] = 0
+
+    def rotate_archive(self, archive: dict):
+        """Close the current part of an archive and start a new one."""
+
+        archive["writer"].close()
+        archive["parts"].append((archive["file"], archive["count"]))
+
+        self.start_archive_part(archive)
+
+    async def save_archive(
+        self, ctx: commands.Context, archive: dict, channels: list
+    ):
+        """Function that stores an archive once the purge is done.
+
+        Each part of the archive is uploaded to the log channel when
+        possible, and stored in the database otherwise. Parts that can't
+        be saved at all are reported to the moderator.
+        """
+        archive["writer"].close()
+        archive["parts"].append((archive["file"], archive["count"]))
+
+        parts = [(file, count) for file, count in archive["parts"] if count]
+        failed = []
+
+        for index, (file, count) in enumerate(parts, 1):
+            filename = f"purge-{ctx.message.id}"
+
+            if len(parts) > 1:
+                filename += f"-{index}"
+
+            filename += ".jsonl.gz"
+
+            try:
+                await self.save_archive_part(
+                    ctx, file, filename, count, channels
+                )
+            except (discord.HTTPException, PyMongoError) as e:
+                logger.error(f"Failed to save the archive {filename}: {e}")
+                failed.append(filename)
+
+        for file, _ in archive["parts"]:
+            file.close()
+
+        if failed:
+            embed = discord.Embed(color=self.bot.error_color)
+
+            embed.description = (
+                "The messages were deleted, but these parts of the archive "
+                f"could not be saved: {', '.join(failed)}."
+            )
+
+            await ctx.send(embed=embed)
+
+    async def save_archive_part(
+        self,
+        ctx: commands.Context,
+        file,
+        filename: str,
+        count: int,
+        channels: list,
+    ):
+        """Upload a part of an archive, or store it in the database."""
+
+        size = file.tell()
+        file.seek(0)
+
+        channel = self.bot.log_channel
+
+        if channel is not None and size <= channel.guild.filesize_limit:
+            s = "" if count == 1 else "s"
+            mentions = ", ".join(channel.mention for channel in channels)
+
+            embed = discord.Embed(
+                title="Purge",
+                description=(
+                    f"Archive of {count} message{s} purged by "
+                    f"{ctx.author.mention} in {mentions}."
+                ),
+                color=self.bot.main_color,
+            )
+
+            try:
+                return await channel.send(
+                    embed=embed, file=discord.File(file, filename)
+                )
+            except discord.HTTPException as e:
+                logger.warning(f"Failed to upload {filename}: {e}")
+                file.seek(0)
+
+        await self.db.insert_one(
+            {
+                "type": "archive",
+                "filename": filename,
+                "author_id": ctx.author.id,
+                "channel_ids": [channel.id for channel in channels],
+                "created_at": discord.utils.utcnow(),
+                "data": file.read(),
+            }
+        )
+
+        logger.info(f"Stored the archive {filename} in the database.")
+
+    async def delete_chunk(self, chunk: list, job: dict):
+        """Bulk delete a chunk of at most 100 recent messages."""
+
+        if job["cancel"].is_set():
+            return
+
+        channel = chunk[0].channel
+
+        if len(chunk) == 1:
+            await chunk[0].delete()
+        else:
+            await channel.delete_messages(chunk)
+
+        job["deleted"] += len(chunk)
+
+        if job["archive"] is not None:
+            for message in chunk:
+                self.archive_message(job["archive"], message)
+
+    async def delete_old(self, queue: asyncio.Queue, job: dict):
+        """Function that deletes queued messages one by one.
+
+        Single deletes in a channel share a rate limit bucket, so when
+        Discord still answers with a 429 after the retries of the
+        library, the worker backs off before trying the message again.
+        The queue is bounded, so a worker that fails keeps draining it
+        without deleting anything, and raises once the scan is done.
+        """
+        backoff = 1
+        error = None
+
+        while True:
+            message = await queue.get()
+
+            if message is None:
+                if error is not None:
+                    raise error
+
+                return
+
+            if error is not None or job["cancel"].is_set():
+                continue
+
+            while True:
+                try:
+                    await message.delete()
+                except discord.NotFound:
+                    break
+                except discord.HTTPException as e:
+                    if e.status != 429:
+                        error = e
+                        break
+
+                    logger.warning(
+                        f"Rate limited while purging #{message.channel}, "
+                        f"retrying in {backoff} seconds."
+                    )
+
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
+                else:
+                    backoff = 1
+                    job["deleted"] += 1
 
-    @commands.command()
+                    if job["archive"] is not None:
+                        self.archive_message(job["archive"], message)
+
+                    break
+
+    def new_job(
+        self,
+        cancel: Optional[asyncio.Event] = None,
+        archive: Optional[dict] = None,
+    ) -> dict:
+        """Create the state of a purge in a single channel."""
+
+        return {
+            "matched": 0,
+            "deleted": 0,
+            "scanning": True,
+            "started": time.perf_counter(),
+            "elapsed": None,
+            "error": None,
+            "cancel": cancel or asyncio.Event(),
+            "archive": archive,
+        }
+
+    def progress_embed(
+        self, jobs: list, amount: Optional[int]
+    ) -> discord.Embed:
+        """Build an embed with the progress of one or more purges."""
+
+        elapsed = time.perf_counter() - min(job["started"] for job in jobs)
+
+        matched = sum(job["matched"] for job in jobs)
+        deleted = sum(job["deleted"] for job in jobs)
+        target = sum(
+            amount
+            if job["scanning"] and amount is not None
+            else job["matched"]
+            for job in jobs
+        )
+        remaining = max(target - deleted, 0)
+
+        embed = discord.Embed(title="Purging", color=self.bot.main_color)
+
+        embed.description = (
+            f"{deleted} of {matched} matching messages have been deleted "
+            "so far."
+        )
+
+        if len(jobs) > 1:
+            done = sum(job["elapsed"] is not None for job in jobs)
+            embed.description += f"\n{done} of {len(jobs)} channels are done."
+
+        if deleted and remaining:
+            eta = discord.utils.utcnow() + datetime.timedelta(
+                seconds=remaining * elapsed / deleted
+            )
+
+            embed.add_field(
+                name="Estimated completion",
+                value=discord.utils.format_dt(eta, "R"),
+            )
+
+        embed.set_footer(text="Use the purge cancel command to stop.")
+
+        return embed
+
+    async def report_progress(
+        self, message: discord.Message, jobs: list, amount: Optional[int]
+    ):
+        """Function that keeps the progress message up to date."""
+
+        while True:
+            await asyncio.sleep(5)
+
+            try:
+                await message.edit(embed=self.progress_embed(jobs, amount))
+            except discord.NotFound:
+                return
+            except discord.HTTPException as e:
+                logger.warning(f"Could not update the purge progress ({e}).")
+
+    async def purge_worker(
+        self,
+        semaphore: asyncio.Semaphore,
+        channel: discord.TextChannel,
+        job: dict,
+        *args,
+    ):
+        """Function that purges one channel of a multi-channel purge.
+
+        Deletes are rate limited per channel, so channels are purged in
+        parallel, but only up to the size of the semaphore at once. A
+        channel that can't be purged doesn't stop the others.
+        """
+        async with semaphore:
+            started = time.perf_counter()
+
+            try:
+                if not job["cancel"].is_set():
+                    await self.purge_channel(channel, job, *args)
+            except discord.Forbidden:
+                job["error"] = "missing permissions"
+            except discord.HTTPException as e:
+                job["error"] = e.text or str(e.status)
+            finally:
+                job["scanning"] = False
+                job["elapsed"] = time.perf_counter() - started
+
+    @commands.group(invoke_without_command=True)
     @checks.has_permissions(PermissionLevel.MODERATOR)
-    async def purge(self, ctx: commands.Context, amount: int):
-        """Delete multiple messages at once."""
+    async def purge(
+        self, ctx: commands.Context, amount: int, *, flags: PurgeFlags
+    ):
+        """Delete multiple messages at once.
+
+        Filters can be added to only delete certain messages, like
+        `user: @member`, `bots: yes`, `regex: pattern`,
+        `attachments: yes`, `links: yes`, `before: message ID` and
+        `after: message ID`. The `scan:` filter sets how many messages
+        are looked at, at most. With `archive: yes`, the purged messages
+        are saved to the log channel.
+
+        A message shows the progress of the purge, and it can be
+        stopped with the `purge cancel` command.
+        """
 
         if amount < 1:
             raise commands.BadArgument(
@@ -24,8 +594,115 @@ class Purger(commands.Cog):
                 f"positive integer, not `{amount}`."
             )
 
+        await self.run_purge(
+            ctx,
+            self.build_check(flags),
+            amount,
+            max(amount, flags.scan),
+            flags.before or ctx.message,
+            flags.after,
+            flags.archive,
+        )
+
+    @purge.command(name="since")
+    @checks.has_permissions(PermissionLevel.MODERATOR)
+    async def purge_since(
+        self, ctx: commands.Context, start: Bound, *, flags: PurgeFlags
+    ):
+        """Delete every message since a message or a point in time.
+
+        The start can be a message ID, a message link or a timestamp,
+        and that message is deleted as well. The same filters as the
+        `purge` command can be added, except for `scan:` and `after:`,
+        since the purge stops at the start instead.
+        """
+
+        await self.run_purge(
+            ctx,
+            self.build_check(flags),
+            None,
+            None,
+            flags.before or ctx.message,
+            discord.Object(id=start.id - 1),
+            flags.archive,
+        )
+
+    @purge.command(name="between")
+    @checks.has_permissions(PermissionLevel.MODERATOR)
+    async def purge_between(
+        self,
+        ctx: commands.Context,
+        start: Bound,
+        end: Bound,
+        *,
+        flags: PurgeFlags,
+    ):
+        """Delete every message between two messages or points in time.
+
+        Both ends can be message IDs, message links or timestamps, and
+        those messages are deleted as well. The same filters as the
+        `purge` command can be added, except for `scan:`, `before:` and
+        `after:`.
+        """
+
+        if start.id >= end.id:
+            raise commands.BadArgument(
+                "The start of the range should come before its end."
+            )
+
+        await self.run_purge(
+            ctx,
+            self.build_check(flags),
+            None,
+            None,
+            discord.Object(id=min(end.id + 1, ctx.message.id)),
+            discord.Object(id=start.id - 1),
+            flags.archive,
+        )
+
+    async def run_purge(
+        self,
+        ctx: commands.Context,
+        check: Callable,
+        amount: Optional[int],
+        limit: Optional[int],
+        before: discord.abc.Snowflake,
+        after: Optional[discord.abc.Snowflake],
+        archive: bool = False,
+    ):
+        """Function that runs a purge in the channel of a command.
+
+        It shows the progress of the purge while it runs, and the
+        amount of deleted messages once it is done.
+        """
+
+        if ctx.channel.id in self.jobs:
+            raise commands.BadArgument(
+                "A purge is already running in this channel."
+            )
+
+        archive = self.open_archive() if archive else None
+
+        job = self.new_job(archive=archive)
+
+        self.jobs[ctx.channel.id] = job
+
+        progress = None
+        reporter = None
+
         try:
-            deleted = await ctx.channel.purge(limit=amount + 1)
+            await ctx.message.delete()
+
+            progress = await ctx.send(
+                embed=self.progress_embed([job], amount)
+            )
+            reporter = asyncio.create_task(
+                self.report_progress(progress, [job], amount)
+            )
+
+            await self.purge_channel(
+                ctx.channel, job, amount, check, limit, before, after
+            )
         except discord.Forbidden:
             embed = discord.Embed(color=self.bot.error_color)
 
@@ -35,17 +712,212 @@ class Purger(commands.Cog):
             )
 
             return await ctx.send(embed=embed)
+        finally:
+            self.jobs.pop(ctx.channel.id, None)
+
+            if reporter is not None:
+                reporter.cancel()
+
+            if progress is not None:
+                try:
+                    await progress.delete()
+                except discord.NotFound:
+                    pass
+
+            if archive is not None:
+                await self.save_archive(ctx, archive, [ctx.channel])
+
+        deleted = job["deleted"]
 
         logger.debug(
-            f"{ctx.author} purged {len(deleted)} messages in the "
+            f"{ctx.author} purged {deleted} messages in the "
             f"#{ctx.channel} channel."
-        )  # len(deleted) >= 2 so no plural checks necessary
+        )
+
+        s = "" if deleted == 1 else "s"
+        have = "has" if deleted == 1 else "have"
+
+        message = f"{deleted} message{s} {have} been deleted!"
+
+        if job["cancel"].is_set():
+            message = f"The purge was cancelled. {message}"
 
-        message = f"{len(deleted)} messages have been deleted!"
         to_delete = await ctx.send(message)
 
         await to_delete.delete(delay=3)
 
+    @purge.command(name="channels", aliases=["category"])
+    @checks.has_permissions(PermissionLevel.MODERATOR)
+    async def purge_channels(
+        self,
+        ctx: commands.Context,
+        targets: commands.Greedy[
+            Union[discord.TextChannel, discord.CategoryChannel]
+        ],
+        amount: int,
+        *,
+        flags: PurgeFlags,
+    ):
+        """Delete multiple messages in several channels at once.
+
+        Channels and categories can be given, in which case every text
+        channel of the category is purged. The amount and filters work
+        like in the `purge` command, for each channel. A few channels
+        are purged at the same time, and a report with the amount of
+        deleted messages per channel is sent at the end.
+        """
+
+        if amount < 1:
+            raise commands.BadArgument(
+                "The amount of messages to delete should be a scrictly "
+                f"positive integer, not `{amount}`."
+            )
+
+        channels = {}
+
+        for target in targets:
+            if isinstance(target, discord.CategoryChannel):
+                channels.update(
+                    (channel.id, channel) for channel in target.text_channels
+                )
+            else:
+                channels[target.id] = target
+
+        if not channels:
+            raise commands.BadArgument("No channels to purge were given.")
+
+        busy = [
+            f"<#{channel_id}>"
+            for channel_id in channels
+            if channel_id in self.jobs
+        ]
+
+        if busy or ctx.channel.id in self.jobs:
+            raise commands.BadArgument(
+                "A purge is already running in "
+                f"{', '.join(busy) or 'this channel'}."
+            )
+
+        check = self.build_check(flags)
+
+        archive = self.open_archive() if flags.archive else None
+
+        cancel = asyncio.Event()
+        jobs = {
+            channel_id: self.new_job(cancel, archive)
+            for channel_id in channels
+        }
+
+        # the purge can be cancelled from any of the channels
+        self.jobs.update(jobs)
+        self.jobs.setdefault(ctx.channel.id, self.new_job(cancel))
+
+        semaphore = asyncio.Semaphore(CHANNEL_WORKERS)
+        before = flags.before or ctx.message
+
+        progress = await ctx.send(
+            embed=self.progress_embed(list(jobs.values()), amount)
+        )
+        reporter = asyncio.create_task(
+            self.report_progress(progress, list(jobs.values()), amount)
+        )
+
+        try:
+            await asyncio.gather(
+                *(
+                    self.purge_worker(
+                        semaphore,
+                        channel,
+                        jobs[channel.id],
+                        amount,
+                        check,
+                        max(amount, flags.scan),
+                        before,
+                        flags.after,
+                    )
+                    for channel in channels.values()
+                )
+            )
+        finally:
+            for channel_id in (*jobs, ctx.channel.id):
+                self.jobs.pop(channel_id, None)
+
+            reporter.cancel()
+
+            try:
+                await progress.delete()
+            except discord.NotFound:
+                pass
+
+            if archive is not None:
+                await self.save_archive(
+                    ctx, archive, list(channels.values())
+                )
+
+        lines = []
+
+        for channel_id, job in jobs.items():
+            if job["error"]:
+                result = f"failed, {job['error'][:100]}"
+            else:
+                s = "" if job["deleted"] == 1 else "s"
+                result = f"{job['deleted']} message{s}"
+
+            elapsed = job["elapsed"] or 0
+            lines.append(f"<#{channel_id}>: {result} in {elapsed:.1f}s")
+
+        deleted = sum(job["deleted"] for job in jobs.values())
+
+        logger.debug(
+            f"{ctx.author} purged {deleted} messages in "
+            f"{len(jobs)} channels."
+        )
+
+        # the report is split over as many embeds as needed
+        embeds = [
+            discord.Embed(
+                title="Purge", description="", color=self.bot.main_color
+            )
+        ]
+
+        for line in lines:
+            description = embeds[-1].description
+
+            if description and len(description) + len(line) >= REPORT_LIMIT:
+                embeds.append(
+                    discord.Embed(description="", color=self.bot.main_color)
+                )
+                description = ""
+
+            embeds[-1].description = f"{description}{line}\n"
+
+        s = "" if deleted == 1 else "s"
+        footer = f"{deleted} message{s} deleted in total"
+
+        if cancel.is_set():
+            footer += ", the purge was cancelled"
+
+        embeds[-1].set_footer(text=f"{footer}.")
+
+        for embed in embeds:
+            await ctx.send(embed=embed)
+
+    @purge.command(name="cancel")
+    @checks.has_permissions(PermissionLevel.MODERATOR)
+    async def purge_cancel(self, ctx: commands.Context):
+        """Stop the purge that is running in this channel."""
+
+        job = self.jobs.get(ctx.channel.id)
+
+        if job is None:
+            raise commands.BadArgument(
+                "There is no purge running in this channel."
+            )
+
+        job["cancel"].set()
+
+        await ctx.message.add_reaction("✅")
+
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Purger(bot))
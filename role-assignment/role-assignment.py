@@ -1,7 +1,9 @@
 import asyncio
+import time
 
 import discord
 from discord.ext import commands
+from pymongo.errors import BulkWriteError
 
 from core import checks
 from core.models import PermissionLevel, getLogger
@@ -17,20 +19,294 @@ class RoleAssignment(commands.Cog):
 
         self.db = self.bot.api.get_plugin_partition(self)
 
-        asyncio.create_task(self.remove_obsolete_ids())
+        self.config = None
+
+        self.seeding = asyncio.Queue()
+        self.seeders = []
+        self.startup_tasks = []
+
+        self.pending = {}
+        self.calls_saved = 0
+
+    async def cog_load(self):
+        await self.load_config()
+
+        self.startup_tasks = [
+            asyncio.create_task(self.migrate_role_names()),
+            asyncio.create_task(self.remove_obsolete_ids()),
+        ]
+
+        self.seeders = [
+            asyncio.create_task(self.seed_reactions()) for _ in range(3)
+        ]
+
+    async def cog_unload(self):
+        for task in (*self.seeders, *self.startup_tasks):
+            task.cancel()
+
+        for pending in self.pending.values():
+            pending["task"].cancel()
+
+    async def seed_reactions(self):
+        """Function that adds the configured reactions to new threads.
+
+        A few of these workers run at the same time, so new threads are
+        seeded concurrently. The reactions on a single message are added
+        one after another, since they share a rate limit bucket anyway
+        and their order should match the configuration.
+        """
+        while True:
+            message, emojis = await self.seeding.get()
+
+            try:
+                for emoji in emojis:
+                    await message.add_reaction(emoji)
+            except discord.NotFound:
+                pass  # the thread was closed in the meantime
+            except discord.HTTPException as e:
+                logger.warning(
+                    f"Could not add the reactions to message {message.id} "
+                    f"({e})."
+                )
+            finally:
+                self.seeding.task_done()
+
+    def queue_role_change(
+        self,
+        member: discord.Member,
+        role: discord.Role,
+        channel: discord.TextChannel,
+        add: bool,
+    ):
+        """Queue a role change, to be merged with others of the member.
+
+        Changes that follow each other within the debounce window are
+        applied with a single edit of the member and reported in a
+        single message.
+        """
+        pending = self.pending.get(member.id)
+
+        if pending is None:
+            pending = {"channel": channel, "add": {}, "remove": {}, "count": 0}
+            self.pending[member.id] = pending
+
+            pending["task"] = asyncio.create_task(
+                self.apply_role_changes(member.id)
+            )
+
+        if add:
+            pending["remove"].pop(role.id, None)
+            pending["add"][role.id] = role
+        else:
+            pending["add"].pop(role.id, None)
+            pending["remove"][role.id] = role
+
+        pending["count"] += 1
+
+    async def apply_role_changes(self, member_id: int):
+        """Function that applies the queued role changes of a member.
+
+        When Discord rejects the changes, the failure is reported in the
+        thread, so the member's reactions aren't silently ignored.
+        """
+        await asyncio.sleep(self.config["debounce"])
+
+        pending = self.pending.pop(member_id)
+        member = self.bot.guild.get_member(member_id)
+
+        if member is None:
+            return
+
+        roles = {role.id: role for role in member.roles}
+
+        added = [
+            role for role in pending["add"].values() if role.id not in roles
+        ]
+        removed = [
+            role for role in pending["remove"].values() if role.id in roles
+        ]
+
+        # each change would have cost a role update and a message
+        calls = 2 if added or removed else 0
+        self.calls_saved += 2 * pending["count"] - calls
+
+        if not calls:
+            return
+
+        for role in added:
+            roles[role.id] = role
+
+        for role in removed:
+            del roles[role.id]
+
+        try:
+            await member.edit(
+                roles=[
+                    role for role in roles.values() if not role.is_default()
+                ]
+            )
+        except discord.HTTPException as e:
+            logger.warning(f"Could not update the roles of {member} ({e}).")
+
+            try:
+                await pending["channel"].send(
+                    f"The roles of {member} could not be updated ({e})."
+                )
+            except discord.HTTPException:
+                pass
+
+            return
+
+        lines = []
+
+        for changed, verb in ((added, "added to"), (removed, "removed from")):
+            if not changed:
+                continue
+
+            names = ", ".join(str(role) for role in changed)
+
+            if len(changed) == 1:
+                lines.append(f"The {names} role has been {verb} {member}.")
+            else:
+                lines.append(f"The {names} roles have been {verb} {member}.")
+
+        try:
+            await pending["channel"].send("\n".join(lines))
+        except discord.HTTPException as e:
+            logger.warning(
+                f"Could not report the role changes of {member} ({e})."
+            )
+
+    async def load_config(self):
+        """Function that loads the configuration file into memory.
+
+        The cached configuration holds the emoji that assign roles, a
+        set of the _genesis message IDs, so reactions can be routed
+        without a database round trip, and the _genesis message ID of
+        each thread channel, so its document can be removed by key when
+        the thread closes. Every command updates both the cache and the
+        database.
+        """
+        config = await self.db.find_one({"_id": "role-config"})
+
+        if config is None:
+            self.config = None
+            return
+
+        documents = await self.db.find({"type": "genesis"}).to_list(None)
+
+        self.config = {
+            "emoji": config.get("emoji", {}),
+            "ids": {document["message_id"] for document in documents},
+            "channels": {
+                document["channel_id"]: document["message_id"]
+                for document in documents
+            },
+            "debounce": config.get("debounce", 2.0),
+        }
+
+        # configuration files of older versions store a list of IDs
+        self.config["ids"].update(
+            int(message_id) for message_id in config.get("ids", [])
+        )
+
+    async def create_config(self):
+        """Create an empty configuration file, if there is none yet."""
+
+        if self.config is not None:
+            return
+
+        await self.db.update_one(
+            {"_id": "role-config"},
+            {"$setOnInsert": {"emoji": {}}},
+            upsert=True,
+        )
+
+        self.config = {
+            "emoji": {},
+            "ids": set(),
+            "channels": {},
+            "debounce": 2.0,
+        }
+
+    async def migrate_role_names(self):
+        """Function that gets invoked whenever this plugin is loaded.
+
+        Older configuration files link each emoji to the name of a
+        role. Those names are replaced by the ID of the role, so roles
+        can be looked up directly and can be renamed safely.
+        """
+        await self.bot.wait_until_ready()
+
+        if self.config is None:
+            return
+
+        names = {
+            emoji: role
+            for emoji, role in self.config["emoji"].items()
+            if isinstance(role, str)
+        }
+
+        if not names:
+            return
+
+        # roles are assigned in the main guild, see get_role
+        guild = self.bot.guild
+
+        if guild is None:
+            logger.warning("No guild_id set.")
+            return
+
+        roles = {role.name: role.id for role in guild.roles}
+        migrated = 0
+
+        for emoji, role_name in names.items():
+            if role_name not in roles:
+                logger.warning(
+                    f"The role associated with {emoji} ({role_name}) could "
+                    "not be found."
+                )
+                continue
+
+            self.config["emoji"][emoji] = roles[role_name]
+            migrated += 1
+
+        if not migrated:
+            return
+
+        await self.db.update_one(
+            {"_id": "role-config"}, {"$set": {"emoji": self.config["emoji"]}}
+        )
+
+        logger.info(f"Migrated {migrated} role name(s) to role IDs.")
+
+    def get_role(self, role_id: int) -> discord.Role:
+        """Resolve a configured role, which might still be a name."""
+
+        if isinstance(role_id, str):
+            return discord.utils.get(self.bot.guild.roles, name=role_id)
+
+        return self.bot.guild.get_role(role_id)
 
     async def remove_obsolete_ids(self):
         """Function that gets invoked whenever this plugin is loaded.
 
         It will look for a configuration file in the database and
-        remove message IDs that no longer exist, in order to prevent
-        them from cluttering the database.
+        reconcile the stored _genesis message IDs with the threads that
+        are currently open, in order to prevent them from cluttering
+        the database. Each _genesis message is stored in a document of
+        its own, keyed by its ID.
+
+        The channels in the category are processed concurrently, at
+        most ten at a time.
         """
-        config = await self.db.find_one({"_id": "role-config"})
+        await self.bot.wait_until_ready()
 
-        if config is None:
+        if self.config is None:
             return
 
+        start = time.perf_counter()
+
         category_id = int(self.bot.config["main_category_id"] or 0)
 
         if category_id == 0:
@@ -47,25 +323,110 @@ class RoleAssignment(commands.Cog):
 
         if category is None:
             logger.warning("Invalid main_category_id set.")
+            return
 
-        message_ids = []
+        cached_ids = set(self.config["ids"])
+        message_ids = {}
+        failed_ids = set()
 
-        for channel in category.text_channels:
-            thread = await self.bot.threads.find(channel=channel)
+        semaphore = asyncio.Semaphore(10)
 
-            if thread is None:
-                continue
+        async def find_genesis_message(channel: discord.TextChannel):
+            async with semaphore:
+                thread = await self.bot.threads.find(channel=channel)
+
+                if thread is None:
+                    return
+
+                if thread._genesis_message is None:
+                    history = channel.history(limit=1, oldest_first=True)
+
+                    try:
+                        async for message in history:
+                            thread._genesis_message = message
+                    except discord.HTTPException as e:
+                        logger.warning(
+                            "Could not find the _genesis message of "
+                            f"#{channel} ({e})."
+                        )
+                        failed_ids.add(channel.id)
+                        return
 
-            if thread._genesis_message is None:
-                history = channel.history(oldest_first=True)
-                thread._genesis_message = [
-                    message async for message in history
-                ][0]
+                if thread._genesis_message is not None:
+                    message_ids[thread._genesis_message.id] = channel.id
 
-            message_ids.append(str(thread._genesis_message.id))
+        await asyncio.gather(
+            *(
+                find_genesis_message(channel)
+                for channel in category.text_channels
+            )
+        )
 
-        await self.db.find_one_and_update(
-            {"_id": "role-config"}, {"$set": {"ids": message_ids}}
+        documents = await self.db.find({"type": "genesis"}).to_list(None)
+        stored_ids = {document["message_id"] for document in documents}
+
+        # threads that were opened in the meantime are not obsolete, and
+        # neither are those of channels that could not be read
+        opened_ids = self.config["ids"] - cached_ids
+        unknown_ids = {
+            document["message_id"]
+            for document in documents
+            if document.get("channel_id") in failed_ids
+        }
+        obsolete_ids = (
+            stored_ids - message_ids.keys() - opened_ids - unknown_ids
+        )
+
+        if obsolete_ids:
+            await self.db.delete_many(
+                {"type": "genesis", "message_id": {"$in": list(obsolete_ids)}}
+            )
+
+        missing_ids = message_ids.keys() - stored_ids
+
+        if missing_ids:
+            try:
+                await self.db.insert_many(
+                    [
+                        {
+                            "_id": f"genesis-{message_id}",
+                            "type": "genesis",
+                            "message_id": message_id,
+                            "channel_id": message_ids[message_id],
+                        }
+                        for message_id in missing_ids
+                    ],
+                    ordered=False,
+                )
+            except BulkWriteError:
+                pass  # inserted by on_thread_ready in the meantime
+
+        await self.db.update_one(
+            {"_id": "role-config"}, {"$unset": {"ids": ""}}
+        )
+
+        self.config["ids"] = (
+            message_ids.keys()
+            | unknown_ids
+            | (self.config["ids"] - cached_ids)
+        )
+
+        channels = {
+            channel_id: message_id
+            for message_id, channel_id in message_ids.items()
+        }
+
+        for channel_id, message_id in self.config["channels"].items():
+            if message_id not in cached_ids or message_id in unknown_ids:
+                channels[channel_id] = message_id
+
+        self.config["channels"] = channels
+
+        elapsed = time.perf_counter() - start
+
+        logger.debug(
+            f"Reconciled {len(message_ids)} _genesis message ID(s) in "
+            f"{elapsed:.2f} seconds."
         )
 
     @commands.group(
@@ -82,23 +443,17 @@ class RoleAssignment(commands.Cog):
     async def role_add(self, ctx, emoji: discord.Emoji, *, role: discord.Role):
         """Add a reaction to each new thread."""
 
-        config = await self.db.find_one({"_id": "role-config"})
+        await self.create_config()
 
-        if config is None:
-            await self.db.insert_one(
-                {"_id": "role-config", "emoji": {}, "ids": []}
-            )
-            config = await self.db.find_one({"_id": "role-config"})
-
-        failed = config["emoji"].get(str(emoji)) is not None
+        failed = self.config["emoji"].get(str(emoji)) is not None
 
         if failed:
             return await ctx.send("That emoji already assigns a role.")
 
-        config["emoji"][str(emoji)] = role.name
+        self.config["emoji"][str(emoji)] = role.id
 
         await self.db.update_one(
-            {"_id": "role-config"}, {"$set": {"emoji": config["emoji"]}}
+            {"_id": "role-config"}, {"$set": {"emoji": self.config["emoji"]}}
         )
 
         await ctx.send(f"{emoji} will now assign the {role.name} role.")
@@ -108,42 +463,73 @@ class RoleAssignment(commands.Cog):
     async def role_remove(self, ctx, emoji: discord.Emoji):
         """Remove a reaction from each new thread."""
 
-        config = await self.db.find_one({"_id": "role-config"})
-
-        if config is None:
+        if self.config is None:
             return await ctx.send("There are no roles set up at the moment.")
 
-        config["emoji"]
-
         try:
-            del config["emoji"][str(emoji)]
+            del self.config["emoji"][str(emoji)]
         except KeyError:
             return await ctx.send("That emoji doesn't assign any role.")
 
         await self.db.update_one(
-            {"_id": "role-config"}, {"$set": {"emoji": config["emoji"]}}
+            {"_id": "role-config"}, {"$set": {"emoji": self.config["emoji"]}}
         )
 
         await ctx.send(f"The {emoji} emoji has been unlinked.")
 
+    @role.command(name="debounce")
+    @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
+    async def role_debounce(self, ctx, seconds: float = None):
+        """Set how long to wait for more reactions of the same member.
+
+        Role changes of a member within this window are merged into a
+        single update and a single message.
+        """
+
+        if seconds is None:
+            window = self.config["debounce"] if self.config else 2.0
+
+            return await ctx.send(
+                f"Role changes are merged within {window} seconds. This "
+                f"saved {self.calls_saved} API call(s) since the plugin "
+                "was loaded."
+            )
+
+        if seconds < 0:
+            raise commands.BadArgument(
+                "The debounce window should be a positive number, not "
+                f"`{seconds}`."
+            )
+
+        await self.create_config()
+
+        await self.db.update_one(
+            {"_id": "role-config"}, {"$set": {"debounce": seconds}}
+        )
+
+        self.config["debounce"] = seconds
+
+        await ctx.send(
+            f"Role changes are now merged within {seconds} seconds."
+        )
+
     @role.command(name="list")
     @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
     async def role_list(self, ctx):
         """View a list of reactions added to each new thread."""
 
-        config = await self.db.find_one({"_id": "role-config"})
-
-        if config is None:
+        if self.config is None:
             return await ctx.send("There are no roles set up at the moment.")
 
         embed = discord.Embed(
             title="Role Assignment", color=self.bot.main_color, description=""
         )
 
-        for emoji, role_name in config["emoji"].items():
-            role = discord.utils.get(self.bot.guild.roles, name=role_name)
+        for emoji, role_id in self.config["emoji"].items():
+            role = self.get_role(role_id)
+            mention = role.mention if role else f"`{role_id}`"
 
-            embed.description += f"{emoji} — {role.mention}\n"
+            embed.description += f"{emoji} — {mention}\n"
 
         await ctx.send(embed=embed)
 
@@ -153,28 +539,58 @@ class RoleAssignment(commands.Cog):
     ):
         """Function that gets invoked whenever a new thread is created.
 
-        It will look for a configuration file in the database and add
-        all emoji as reactions to the _genesis message. Furthermore, it
-        will update the list of _genesis message IDs.
+        It will store the ID of the _genesis message, so reactions on
+        it are handled right away. Afterwards, it will queue all
+        configured emoji to be added as reactions to the message.
         """
         message = thread._genesis_message
 
-        config = await self.db.find_one({"_id": "role-config"})
+        if self.config is None:
+            return
 
-        if config is None:
+        self.config["ids"].add(message.id)
+        self.config["channels"][thread.channel.id] = message.id
+
+        await self.db.update_one(
+            {"_id": f"genesis-{message.id}"},
+            {
+                "$set": {
+                    "type": "genesis",
+                    "message_id": message.id,
+                    "channel_id": thread.channel.id,
+                }
+            },
+            upsert=True,
+        )
+
+        emojis = [
+            emoji.strip("<:>")  # unannounced Discord API breaking change >:(
+            for emoji in self.config["emoji"].keys()
+        ]
+
+        if emojis:
+            self.seeding.put_nowait((message, emojis))
+
+    @commands.Cog.listener()
+    async def on_thread_close(
+        self, thread, closer, silent, delete_channel, message, scheduled
+    ):
+        """Function that gets invoked whenever a thread is closed.
+
+        It will remove the stored ID of the _genesis message, since
+        reactions on it no longer need to be handled.
+        """
+        if self.config is None or thread.channel is None:
             return
 
-        for emoji in config["emoji"].keys():
-            stripped_emoji = emoji.strip(
-                "<:>"
-            )  # unannounced Discord API breaking change >:(
-            await message.add_reaction(stripped_emoji)
+        message_id = self.config["channels"].pop(thread.channel.id, None)
+
+        if message_id is None:
+            return
 
-        config["ids"].append(str(message.id))
+        self.config["ids"].discard(message_id)
 
-        await self.db.find_one_and_update(
-            {"_id": "role-config"}, {"$set": {"ids": config["ids"]}}
-        )
+        await self.db.delete_one({"_id": f"genesis-{message_id}"})
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(
@@ -182,21 +598,19 @@ class RoleAssignment(commands.Cog):
     ):
         """Function that gets invoked whenever a reaction is added.
 
-        It will look for a configuration file in the database and
-        update the member's role according to the added emoji.
+        It will look up the message and emoji in the cached
+        configuration and update the member's role according to the
+        added emoji.
         """
-        config = await self.db.find_one({"_id": "role-config"})
+        config = self.config
 
-        if config is None:
+        if config is None or payload.message_id not in config["ids"]:
             return
 
-        if str(payload.message_id) not in config["ids"]:
-            return
-
-        if str(payload.emoji) not in config["emoji"].keys():
+        if str(payload.emoji) not in config["emoji"]:
             payload.emoji.animated = True
 
-            if str(payload.emoji) not in config["emoji"].keys():
+            if str(payload.emoji) not in config["emoji"]:
                 return
 
         if payload.user_id == self.bot.user.id:
@@ -215,20 +629,21 @@ class RoleAssignment(commands.Cog):
 
         member = self.bot.guild.get_member(user)
 
-        role_name = config["emoji"][str(payload.emoji)]
-        role = discord.utils.get(self.bot.guild.roles, name=role_name)
+        if member is None:
+            return
+
+        role_id = config["emoji"][str(payload.emoji)]
+        role = self.get_role(role_id)
 
         if role is None:
             message = (
-                f"The role associated with {payload.emoji} ({role_name}) "
+                f"The role associated with {payload.emoji} ({role_id}) "
                 "could not be found."
             )
 
-            await channel.send(message)
-
-        await member.add_roles(role)
+            return await channel.send(message)
 
-        await channel.send(f"The {role} role has been added to {member}.")
+        self.queue_role_change(member, role, channel, add=True)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(
@@ -236,21 +651,19 @@ class RoleAssignment(commands.Cog):
     ):
         """Function that gets invoked whenever a reaction is removed.
 
-        It will look for a configuration file in the database and
-        update the member's role according to the removed emoji.
+        It will look up the message and emoji in the cached
+        configuration and update the member's role according to the
+        removed emoji.
         """
-        config = await self.db.find_one({"_id": "role-config"})
-
-        if config is None:
-            return
+        config = self.config
 
-        if str(payload.message_id) not in config["ids"]:
+        if config is None or payload.message_id not in config["ids"]:
             return
 
-        if str(payload.emoji) not in config["emoji"].keys():
+        if str(payload.emoji) not in config["emoji"]:
             payload.emoji.animated = True
 
-            if str(payload.emoji) not in config["emoji"].keys():
+            if str(payload.emoji) not in config["emoji"]:
                 return
 
         if payload.user_id == self.bot.user.id:
@@ -269,18 +682,19 @@ class RoleAssignment(commands.Cog):
 
         member = self.bot.guild.get_member(user)
 
-        role_name = config["emoji"][str(payload.emoji)]
-        role = discord.utils.get(self.bot.guild.roles, name=role_name)
+        if member is None:
+            return
+
+        role_id = config["emoji"][str(payload.emoji)]
+        role = self.get_role(role_id)
 
         if role is None:
-            await channel.send(
-                f"The role associated with {payload.emoji} ({role_name}) "
+            return await channel.send(
+                f"The role associated with {payload.emoji} ({role_id}) "
                 "could not be found."
             )
 
-        await member.remove_roles(role)
-
-        await channel.send(f"The {role} role has been removed from {member}.")
+        self.queue_role_change(member, role, channel, add=False)
 
 
 async def setup(bot: commands.Bot):
@@ -1,8 +1,13 @@
+import asyncio
+import collections
 import datetime
-from typing import Union
+import heapq
+import time
+from typing import Optional, Union
 
 import discord
 from discord.ext import commands, tasks
+from pymongo.errors import BulkWriteError
 
 from core import checks
 from core.models import PermissionLevel, getLogger
@@ -10,6 +15,16 @@ from core.time import UserFriendlyTime
 
 logger = getLogger(__name__)
 
+ACTIONS = ("message", "ping", "close")
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Return the value below which `fraction` of the values fall."""
+
+    ordered = sorted(values)
+
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
 
 class StaleAlert(commands.Cog):
     """Plugin to alert when tickets are going stale."""
@@ -19,91 +34,790 @@ class StaleAlert(commands.Cog):
 
         self.db = self.bot.api.get_plugin_partition(self)
 
+        self.activity = {}
+
+        self.config = {
+            "duration": None,
+            "message": "alert",
+            "ignore": set(),
+            "workers": 5,
+            "policies": {},
+        }
+
+        self.default_policy = []
+
+        self.deadlines = []
+        self.wakeup = asyncio.Event()
+
+        self.backoff = {}
+
+        self.stats = collections.Counter()
+        self.last_tick = None
+        self.last_rebuild = None
+        self.send_latencies = collections.deque(maxlen=1000)
+
     async def cog_load(self):
+        await self.load_config()
+
         self.check_threads_loop.start()
 
-    @tasks.loop(minutes=5)
-    async def check_threads_loop(self):
-        """Function that executes every five minutes.
+    async def cog_unload(self):
+        self.check_threads_loop.cancel()
 
-        It checks every open thread to see if the last sent message in
-        the channel was sent earlier than the configured time duration.
-        If so, it will send the configured alert message and make a
-        note entry in the logs.
+    async def load_config(self):
+        """Function that loads the configuration file into memory.
+
+        Every command updates both the cached configuration and the
+        database, so the configuration file only has to be fetched
+        once.
         """
         config = await self.db.find_one({"_id": "stale-alert-config"})
 
-        if not config:
+        if config:
+            self.config["duration"] = config.get("duration")
+            self.config["message"] = config.get("message", "alert")
+            self.config["ignore"] = set(config.get("ignore", []))
+            self.config["workers"] = config.get("workers", 5)
+            self.config["policies"] = {
+                int(category_id): tiers
+                for category_id, tiers in config.get("policies", {}).items()
+            }
+
+        self.refresh_default_policy()
+
+    def refresh_default_policy(self):
+        """Derive the policy of uncategorised threads from the config.
+
+        Threads in a category without a policy of its own send the
+        configured message once the configured duration has passed.
+        """
+        if self.config["duration"] is None:
+            self.default_policy = []
             return
 
-        try:
-            duration = config["duration"]
-        except KeyError:
-            return logger.error(
-                "Something went wrong in the database! The `duration` field "
-                "could not be found in the configuration file."
-            )
+        self.default_policy = [
+            {
+                "after": self.config["duration"],
+                "action": "message",
+                "message": self.config["message"],
+                "role": None,
+            }
+        ]
 
-        message = config.get("message", "alert")
-        ignore = config.get("ignore", [])
+    def policy_for(self, channel_id: int) -> list:
+        """Resolve the escalation tiers that apply to a thread."""
 
-        open_threads = await self.bot.api.get_open_logs()
+        channel = self.bot.get_channel(channel_id)
 
-        counter = 0
+        if channel is not None:
+            policy = self.config["policies"].get(channel.category_id)
+
+            if policy:
+                return policy
+
+        return self.default_policy
+
+    def deadline_for(self, entry: dict) -> datetime.datetime:
+        """Compute when the next tier of an entry is due, if any.
+
+        A tier that failed is not due before its retry, even when the
+        scheduler is rebuilt in the meantime.
+        """
+        policy = self.policy_for(entry["channel_id"])
+
+        if entry["tier"] >= len(policy):
+            return None
+
+        deadline = entry["timestamp"] + datetime.timedelta(
+            seconds=policy[entry["tier"]]["after"]
+        )
+
+        if entry.get("retry_at") is not None:
+            deadline = max(deadline, entry["retry_at"])
+
+        return deadline
+
+    async def update_config(self, update: dict):
+        """Write an update of the configuration file to the database."""
+
+        await self.db.update_one(
+            {"_id": "stale-alert-config"}, update, upsert=True
+        )
+
+    def schedule(self, entry: dict):
+        """Push the stale deadline of an entry onto the scheduler.
+
+        Deadlines that were pushed earlier for the same thread are not
+        removed from the heap, but are discarded once they are popped
+        because they no longer match the deadline of the entry.
+        """
+        deadline = self.deadline_for(entry)
+
+        entry["deadline"] = deadline
+
+        if deadline is None:
+            return
+
+        if not self.deadlines or entry["deadline"] < self.deadlines[0][0]:
+            self.wakeup.set()
+
+        heapq.heappush(
+            self.deadlines, (entry["deadline"], entry["channel_id"])
+        )
+
+        if len(self.deadlines) > 2 * len(self.activity) + 64:
+            self.schedule_all()
+
+    def schedule_all(self):
+        """Rebuild the scheduler from the last-activity index."""
+
+        self.deadlines = []
+
+        for entry in self.activity.values():
+            entry["deadline"] = self.deadline_for(entry)
+
+            if entry["deadline"] is not None:
+                self.deadlines.append(
+                    (entry["deadline"], entry["channel_id"])
+                )
+
+        heapq.heapify(self.deadlines)
+
+        self.wakeup.set()
+
+    def pop_due(self) -> list:
+        """Pop the entries of which the stale deadline has passed."""
+
+        now = discord.utils.utcnow()
+        due = []
+
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, channel_id = heapq.heappop(self.deadlines)
+            entry = self.activity.get(channel_id)
+
+            if entry is not None and entry["deadline"] == deadline:
+                entry["deadline"] = None
+                due.append(entry)
+
+        return due
+
+    async def load_activity(self):
+        """Function that loads the last-activity index.
+
+        The index holds an entry for every open thread of which the
+        most recent message still awaits a response from the staff. It
+        is persisted in the plugin partition and only rebuilt from the
+        thread logs when it hasn't been built yet, which is tracked by
+        a marker document written after a successful rebuild. Entries
+        that listeners recorded in the meantime are kept.
+
+        Threads that were alerted before have a ledger entry, which
+        holds the start of the staleness episode and the tier that was
+        reached, so alerts sent by the bot are not mistaken for new
+        activity.
+        """
+        documents = await self.db.find(
+            {"type": {"$in": ["activity", "ledger", "index"]}}
+        ).to_list(None)
+
+        built = any(document["type"] == "index" for document in documents)
+
+        ledgers = {
+            document["channel_id"]: document
+            for document in documents
+            if document["type"] == "ledger"
+        }
+
+        documents = [
+            document
+            for document in documents
+            if document["type"] == "activity"
+        ]
+
+        if not built:
+            documents += await self.rebuild_activity()
+
+        for document in documents:
+            entry = {
+                "channel_id": document["channel_id"],
+                "recipient_id": document["recipient_id"],
+                "key": document["key"],
+                "timestamp": datetime.datetime.fromisoformat(
+                    document["timestamp"]
+                ),
+                "tier": 0,
+                "alerted_at": None,
+            }
+
+            ledger = ledgers.get(entry["channel_id"])
+
+            if ledger is not None:
+                alerted_at = datetime.datetime.fromisoformat(
+                    ledger["alerted_at"]
+                )
+
+                if entry["timestamp"] <= alerted_at:
+                    entry["timestamp"] = datetime.datetime.fromisoformat(
+                        ledger["since"]
+                    )
+                    entry["tier"] = ledger["tier"]
+                    entry["alerted_at"] = alerted_at
+
+            self.activity.setdefault(entry["channel_id"], entry)
+
+        logger.debug(f"Loaded {len(self.activity)} activity entries.")
+
+    async def rebuild_activity(self) -> list:
+        """Function that rebuilds the last-activity index from the logs.
+
+        It looks up the most recent relevant message of every open
+        thread and persists an entry for the threads that are awaiting
+        a response from the staff.
+        """
+        start = time.perf_counter()
+
+        threads = await self.fetch_last_activity()
+
+        self.last_rebuild = {
+            "threads": len(threads),
+            "fetch": time.perf_counter() - start,
+        }
+        self.stats["rebuilds"] += 1
+
+        documents = [
+            {
+                "_id": f"activity-{thread['channel_id']}",
+                "type": "activity",
+                "channel_id": int(thread["channel_id"]),
+                "recipient_id": int(thread["recipient"]["id"]),
+                "key": thread["key"],
+                "timestamp": datetime.datetime.fromisoformat(
+                    thread["timestamp"]
+                )
+                .astimezone(datetime.timezone.utc)
+                .isoformat(),
+            }
+            for thread in threads
+        ]
+
+        if documents:
+            try:
+                await self.db.insert_many(documents, ordered=False)
+            except BulkWriteError:
+                pass  # recorded by a listener in the meantime
+
+        await self.db.update_one(
+            {"_id": "stale-alert-index"},
+            {"$set": {"type": "index", "built_at": discord.utils.utcnow()}},
+            upsert=True,
+        )
+
+        return documents
+
+    async def fetch_last_activity(self) -> list:
+        """Function that fetches the last relevant message of each thread.
+
+        The most recent message that is either a thread message or a
+        system message sent by the bot is looked up for every open
+        thread. Threads of which that message was sent by a moderator
+        are left out, since they are awaiting a response from the
+        recipient instead.
+
+        When the logs are stored in MongoDB, this is done with an
+        aggregation pipeline, so only the channel ID, recipient ID, key
+        and timestamp of each thread are sent over the wire, along with
+        the amount of messages that were looked at. Otherwise, the open
+        logs are fetched and scanned in full.
+        """
+        logs = getattr(self.bot.api, "logs", None)
+
+        if logs is None:
+            return self.scan_open_logs(await self.bot.api.get_open_logs())
+
+        relevant = {
+            "$or": [
+                {"$eq": ["$$message.type", "thread_message"]},
+                {
+                    "$and": [
+                        {"$eq": ["$$message.type", "system"]},
+                        {
+                            "$eq": [
+                                "$$message.author.id",
+                                str(self.bot.user.id),
+                            ]
+                        },
+                    ]
+                },
+            ]
+        }
+
+        pipeline = [
+            {"$match": {"open": True}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "channel_id": 1,
+                    "recipient.id": 1,
+                    "key": 1,
+                    "scanned": {"$size": {"$ifNull": ["$messages", []]}},
+                    "last": {
+                        "$arrayElemAt": [
+                            {
+                                "$filter": {
+                                    "input": "$messages",
+                                    "as": "message",
+                                    "cond": relevant,
+                                }
+                            },
+                            -1,
+                        ]
+                    },
+                }
+            },
+            {
+                "$facet": {
+                    "threads": [
+                        {
+                            "$match": {
+                                "$or": [
+                                    {"last.type": "system"},
+                                    {"last.author.mod": False},
+                                ]
+                            }
+                        },
+                        {
+                            "$project": {
+                                "channel_id": 1,
+                                "recipient.id": 1,
+                                "key": 1,
+                                "timestamp": "$last.timestamp",
+                            }
+                        },
+                    ],
+                    "scanned": [
+                        {
+                            "$group": {
+                                "_id": None,
+                                "count": {"$sum": "$scanned"},
+                            }
+                        }
+                    ],
+                }
+            },
+        ]
+
+        result = await logs.aggregate(pipeline).to_list(None)
+
+        if not result:
+            return []
+
+        for scanned in result[0]["scanned"]:
+            self.stats["messages_scanned"] += scanned["count"]
+
+        return result[0]["threads"]
+
+    def scan_open_logs(self, open_threads: list) -> list:
+        """Scan full log documents the way the aggregation pipeline does."""
+
+        threads = []
 
         for thread in open_threads:
             most_recent_message = None
 
+            self.stats["messages_scanned"] += len(thread["messages"])
+
             for thread_message in thread["messages"]:
                 if thread_message["type"] == "thread_message" or (
                     thread_message["type"] == "system"
-                    and int(thread_message["author"]["id"]) == self.bot.user.id
+                    and int(thread_message["author"]["id"])
+                    == self.bot.user.id
                 ):
                     most_recent_message = thread_message
 
-            if (
-                thread_message["type"] == "thread_message"
+            if most_recent_message is None or (
+                most_recent_message["type"] == "thread_message"
                 and most_recent_message["author"]["mod"]
             ):
                 continue
 
-            timestamp = datetime.datetime.fromisoformat(
-                most_recent_message["timestamp"]
-            ).astimezone(datetime.timezone.utc)
+            threads.append(
+                {
+                    "channel_id": thread["channel_id"],
+                    "recipient": {"id": thread["recipient"]["id"]},
+                    "key": thread["key"],
+                    "timestamp": most_recent_message["timestamp"],
+                }
+            )
 
-            delta = (discord.utils.utcnow() - timestamp).total_seconds()
+        return threads
 
-            if delta > duration:
-                channel = self.bot.get_channel(int(thread["channel_id"]))
-                recipient = self.bot.get_user(int(thread["recipient"]["id"]))
+    async def record_activity(self, thread, timestamp: datetime.datetime):
+        """Mark a thread as awaiting a response since `timestamp`.
 
-                if not channel:
-                    logger.warning(
-                        "Found an open thread without a valid channel ID: "
-                        f"{thread['key']}."
-                    )
-                    continue
+        This starts a new staleness episode, so the ledger entry of the
+        previous episode is removed.
+        """
+        previous = self.activity.get(thread.channel.id, {})
+
+        entry = {
+            "channel_id": thread.channel.id,
+            "recipient_id": thread.id,
+            "key": previous.get("key"),
+            "timestamp": timestamp.astimezone(datetime.timezone.utc),
+            "tier": 0,
+            "alerted_at": None,
+        }
+
+        self.activity[entry["channel_id"]] = entry
+        self.schedule(entry)
+
+        await self.save_activity(entry)
+
+        if previous.get("alerted_at") is not None:
+            await self.db.delete_one({"_id": f"ledger-{entry['channel_id']}"})
+
+    async def save_ledger(self, entry: dict):
+        """Persist the alert ledger entry of a thread."""
+
+        await self.db.update_one(
+            {"_id": f"ledger-{entry['channel_id']}"},
+            {
+                "$set": {
+                    "type": "ledger",
+                    "channel_id": entry["channel_id"],
+                    "since": entry["timestamp"].isoformat(),
+                    "alerted_at": entry["alerted_at"].isoformat(),
+                    "tier": entry["tier"],
+                }
+            },
+            upsert=True,
+        )
 
-                if not recipient:
-                    logger.warning(
-                        "Found an open thread without a valid recipient ID: "
-                        f"{thread['key']}."
-                    )
-                    continue
+    async def save_activity(self, entry: dict):
+        """Persist an entry of the last-activity index."""
+
+        await self.db.update_one(
+            {"_id": f"activity-{entry['channel_id']}"},
+            {
+                "$set": {
+                    "type": "activity",
+                    "channel_id": entry["channel_id"],
+                    "recipient_id": entry["recipient_id"],
+                    "key": entry["key"],
+                    "timestamp": entry["timestamp"].isoformat(),
+                }
+            },
+            upsert=True,
+        )
+
+    async def drop_activity(self, channel_id: int):
+        """Remove a thread from the last-activity index."""
+
+        if self.activity.pop(channel_id, None) is None:
+            return
+
+        await self.db.delete_many(
+            {
+                "_id": {
+                    "$in": [f"activity-{channel_id}", f"ledger-{channel_id}"]
+                }
+            }
+        )
+
+    @commands.Cog.listener()
+    async def on_thread_ready(
+        self, thread, creator, category, initial_message
+    ):
+        """Function that gets invoked whenever a new thread is created.
+
+        Threads that were opened by the recipient are awaiting a
+        response from the staff from the very start.
+        """
+        if initial_message is None:
+            return
+
+        await self.record_activity(thread, initial_message.created_at)
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        """Function that gets invoked whenever a message is sent.
+
+        Direct messages from a recipient reset the last activity of
+        their thread.
+        """
+        if message.guild is not None or message.author.bot:
+            return
+
+        thread = await self.bot.threads.find(recipient=message.author)
+
+        if thread is None or thread.channel is None:
+            return
+
+        await self.record_activity(thread, message.created_at)
+
+    @commands.Cog.listener()
+    async def on_thread_reply(
+        self, thread, from_mod, message, anonymous, plain
+    ):
+        """Function that gets invoked whenever a thread is replied to.
+
+        Threads that were replied to by a moderator no longer await a
+        response from the staff.
+        """
+        if not from_mod or thread.channel is None:
+            return
+
+        await self.drop_activity(thread.channel.id)
+
+    @commands.Cog.listener()
+    async def on_thread_close(
+        self, thread, closer, silent, delete_channel, message, scheduled
+    ):
+        """Function that gets invoked whenever a thread is closed."""
+
+        if thread.channel is None:
+            return
+
+        await self.drop_activity(thread.channel.id)
+
+    @tasks.loop()
+    async def check_threads_loop(self):
+        """Function that sleeps until the earliest stale deadline.
+
+        It is woken up early whenever an earlier deadline is scheduled.
+        Once the deadline of a thread has passed, it will send the
+        configured alert message and make a note entry in the logs.
+        Threads of which the deadline has not passed yet are not
+        touched. After every tick, a `stale_alert_tick` event is
+        dispatched with the statistics of that tick.
+        """
+        self.wakeup.clear()
+
+        timeout = None
+
+        if self.deadlines:
+            timeout = (
+                self.deadlines[0][0] - discord.utils.utcnow()
+            ).total_seconds()
+
+        if timeout is None or timeout > 0:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        due = self.pop_due()
+
+        if not due:
+            return
+
+        start = time.perf_counter()
+
+        ignore = self.config["ignore"]
+
+        alerts = []
+        skipped = collections.Counter()
+
+        for entry in due:
+            channel = self.bot.get_channel(entry["channel_id"])
+            recipient = self.bot.get_user(entry["recipient_id"])
+
+            if not channel:
+                logger.warning(
+                    "Found an open thread without a valid channel ID: "
+                    f"{entry['key'] or entry['channel_id']}."
+                )
+                await self.drop_activity(entry["channel_id"])
+                skipped["missing_channel"] += 1
+                continue
+
+            if not recipient:
+                logger.warning(
+                    "Found an open thread without a valid recipient ID: "
+                    f"{entry['key'] or entry['channel_id']}."
+                )
+                skipped["missing_recipient"] += 1
+                continue
+
+            if channel.id in ignore or channel.category_id in ignore:
+                skipped["ignored"] += 1
+                continue
+
+            policy = self.policy_for(channel.id)
+            now = discord.utils.utcnow()
+
+            tier = entry["tier"]
+
+            while (
+                tier + 1 < len(policy)
+                and entry["timestamp"]
+                + datetime.timedelta(seconds=policy[tier + 1]["after"])
+                <= now
+            ):
+                tier += 1
+
+            alerts.append((entry, channel, policy, tier))
+
+        evaluation = time.perf_counter() - start
+
+        semaphore = asyncio.Semaphore(self.config["workers"])
+
+        results = await asyncio.gather(
+            *(
+                self.send_alert(entry, channel, policy, tier, semaphore)
+                for entry, channel, policy, tier in alerts
+            )
+        )
+
+        elapsed = time.perf_counter() - start
+
+        skipped["failed"] = results.count(False)
+
+        self.last_tick = {
+            "finished_at": discord.utils.utcnow(),
+            "threads": len(due),
+            "sent": sum(results),
+            "skipped": skipped,
+            "evaluation": evaluation,
+            "duration": elapsed,
+        }
+
+        self.stats["ticks"] += 1
+        self.stats["threads_scanned"] += len(due)
+        self.stats["sent"] += sum(results)
+        self.stats.update(
+            {f"skipped_{reason}": count for reason, count in skipped.items()}
+        )
+
+        self.bot.dispatch("stale_alert_tick", self.last_tick)
+
+        logger.debug(
+            f"Sent {sum(results)} stale alert(s) in {elapsed:.2f} seconds."
+        )
+
+    async def send_alert(
+        self,
+        entry: dict,
+        channel: discord.TextChannel,
+        policy: list,
+        tier: int,
+        semaphore: asyncio.Semaphore,
+    ) -> bool:
+        """Function that runs the action of a tier on a stale thread.
+
+        At most `workers` actions are run at the same time. When Discord
+        rejects the action, or the alert can't be added to the thread
+        logs, the thread is retried later with a delay that doubles with
+        every consecutive failure in that channel. Database errors are
+        logged rather than raised, so they can't stop the scheduler.
+        Every tier is run at most once per staleness episode, which is
+        kept track of in the alert ledger.
+        """
+        step = policy[tier]
+
+        async with semaphore:
+            start = time.perf_counter()
+
+            try:
+                if step["action"] == "close":
+                    thread = await self.bot.threads.find(channel=channel)
+
+                    if thread is not None:
+                        await thread.close(
+                            closer=self.bot.user, message=step["message"]
+                        )
+
+                    self.send_latencies.append(time.perf_counter() - start)
+                    self.backoff.pop(channel.id, None)
 
-                if channel.id in ignore or channel.category.id in ignore:
-                    continue
+                    try:
+                        await self.drop_activity(channel.id)
+                    except Exception:
+                        logger.error(
+                            f"Could not remove #{channel} from the index.",
+                            exc_info=True,
+                        )
 
-                sent_message = await channel.send(message)
+                    return True
+
+                content = step["message"]
+                allowed_mentions = None
+
+                if step["action"] == "ping":
+                    role = channel.guild.get_role(step["role"])
+
+                    if role is not None:
+                        content = f"{role.mention} {content}"
+                        allowed_mentions = discord.AllowedMentions(
+                            roles=[role]
+                        )
+
+                sent_message = await channel.send(
+                    content, allowed_mentions=allowed_mentions
+                )
+
+                self.send_latencies.append(time.perf_counter() - start)
+            except discord.HTTPException as e:
+                self.retry_later(entry, channel, f"Could not send ({e})")
+                return False
+
+            try:
                 await self.bot.api.append_log(sent_message, type_="system")
+            except Exception as e:
+                # the alert is sent again with the retry, so remove it
+                try:
+                    await sent_message.delete()
+                except discord.HTTPException:
+                    pass
+
+                self.retry_later(entry, channel, f"Could not log ({e})")
+                return False
+
+            self.backoff.pop(channel.id, None)
+
+            entry["retry_at"] = None
+            entry["tier"] = tier + 1
+            entry["alerted_at"] = sent_message.created_at
+
+            self.schedule(entry)
 
-                counter += 1
+            try:
+                await self.save_ledger(entry)
+            except Exception:
+                logger.error(
+                    f"Could not save the alert ledger of #{channel}.",
+                    exc_info=True,
+                )
+
+            return True
+
+    def retry_later(
+        self, entry: dict, channel: discord.TextChannel, reason: str
+    ):
+        """Retry a tier later, with a delay that doubles every failure."""
+
+        failures = self.backoff.get(channel.id, 0) + 1
+        self.backoff[channel.id] = failures
+
+        delay = min(30 * 2 ** (failures - 1), 3600)
+
+        logger.warning(
+            f"{reason} a stale alert in #{channel}, retrying in {delay} "
+            "seconds."
+        )
+
+        entry["retry_at"] = discord.utils.utcnow() + datetime.timedelta(
+            seconds=delay
+        )
 
-        logger.debug(f"Sent {counter} stale alert(s).")
+        self.schedule(entry)
 
     @check_threads_loop.before_loop
     async def before_check_threads_loop(self):
         await self.bot.wait_for_connected()
+        await self.load_activity()
+
+        self.schedule_all()
 
     @commands.group(name="stale", invoke_without_command=True)
     @checks.has_permissions(PermissionLevel.SUPPORTER)
@@ -125,23 +839,14 @@ class StaleAlert(commands.Cog):
         if not channel:
             channel = ctx.channel
 
-        config = await self.db.find_one({"_id": "stale-alert-config"})
-
-        if not config:
-            await self.db.insert_one({"_id": "stale-alert-config"})
-
-        ignore_list = config.get("ignore", [])
-
-        if channel.id in ignore_list:
+        if channel.id in self.config["ignore"]:
             return await ctx.send(
                 "That channel or category is already being ignored."
             )
 
-        ignore_list.append(channel.id)
+        await self.update_config({"$addToSet": {"ignore": channel.id}})
 
-        await self.db.find_one_and_update(
-            {"_id": "stale-alert-config"}, {"$set": {"ignore": ignore_list}}
-        )
+        self.config["ignore"].add(channel.id)
 
         message = f"The <#{channel.id}> channel"
 
@@ -172,23 +877,16 @@ class StaleAlert(commands.Cog):
         if not channel:
             channel = ctx.channel
 
-        config = await self.db.find_one({"_id": "stale-alert-config"})
-
-        if not config:
-            await self.db.insert_one({"_id": "stale-alert-config"})
-
-        ignore_list = config.get("ignore", [])
-
-        if channel.id not in ignore_list:
+        if channel.id not in self.config["ignore"]:
             return await ctx.send(
                 "That channel or category is not being ignored."
             )
 
-        ignore_list.remove(channel.id)
+        await self.update_config({"$pull": {"ignore": channel.id}})
 
-        await self.db.find_one_and_update(
-            {"_id": "stale-alert-config"}, {"$set": {"ignore": ignore_list}}
-        )
+        self.config["ignore"].discard(channel.id)
+
+        self.schedule_all()
 
         message = f"The <#{channel.id}> channel"
 
@@ -216,14 +914,10 @@ class StaleAlert(commands.Cog):
         if not message:
             return await ctx.send_help(ctx.command)
 
-        config = await self.db.find_one({"_id": "stale-alert-config"})
+        await self.update_config({"$set": {"message": message}})
 
-        if not config:
-            await self.db.insert_one({"_id": "stale-alert-config"})
-
-        await self.db.find_one_and_update(
-            {"_id": "stale-alert-config"}, {"$set": {"message": message}}
-        )
+        self.config["message"] = message
+        self.refresh_default_policy()
 
         embed = discord.Embed(
             title="Stale Alert",
@@ -243,21 +937,303 @@ class StaleAlert(commands.Cog):
         if not duration:
             return await ctx.send_help(ctx.command)
 
-        config = await self.db.find_one({"_id": "stale-alert-config"})
+        seconds = (duration.dt - duration.now).total_seconds()
 
-        if not config:
-            await self.db.insert_one({"_id": "stale-alert-config"})
+        await self.update_config({"$set": {"duration": seconds}})
 
-        seconds = (duration.dt - duration.now).total_seconds()
+        self.config["duration"] = seconds
+        self.refresh_default_policy()
+        self.schedule_all()
 
-        await self.db.find_one_and_update(
-            {"_id": "stale-alert-config"}, {"$set": {"duration": seconds}}
+        embed = discord.Embed(
+            title="Stale Alert",
+            color=self.bot.main_color,
+            description=f"The time duration was set to {seconds} seconds.",
         )
 
+        await ctx.send(embed=embed)
+
+    @stale.group(name="policy", invoke_without_command=True)
+    @checks.has_permissions(PermissionLevel.MODERATOR)
+    async def stale_policy(self, ctx: commands.Context):
+        """Escalate stale tickets in several steps, per category."""
+
+        await ctx.send_help(ctx.command)
+
+    @stale_policy.command(name="add")
+    @checks.has_permissions(PermissionLevel.MODERATOR)
+    async def stale_policy_add(
+        self,
+        ctx: commands.Context,
+        category: discord.CategoryChannel,
+        action: str,
+        role: Optional[discord.Role] = None,
+        *,
+        after: UserFriendlyTime = None,
+    ):
+        """Add a step to the escalation policy of a category.
+
+        The action should be `message`, `ping` or `close`. A role is
+        only needed for `ping`. The time is followed by the message to
+        send, or the message to close the ticket with.
+        """
+
+        if not after:
+            return await ctx.send_help(ctx.command)
+
+        action = action.lower()
+
+        if action not in ACTIONS:
+            raise commands.BadArgument(
+                f"The action should be one of {', '.join(ACTIONS)}, not "
+                f"`{action}`."
+            )
+
+        if action == "ping" and role is None:
+            raise commands.BadArgument("The `ping` action requires a role.")
+
+        seconds = (after.dt - after.now).total_seconds()
+
+        message = after.arg
+
+        if action != "close":
+            message = message or self.config["message"]
+
+        step = {
+            "after": seconds,
+            "action": action,
+            "message": message,
+            "role": role.id if role else None,
+        }
+
+        policy = [
+            other
+            for other in self.config["policies"].get(category.id, [])
+            if other["after"] != seconds
+        ]
+        policy.append(step)
+        policy.sort(key=lambda other: other["after"])
+
+        await self.update_config(
+            {"$set": {f"policies.{category.id}": policy}}
+        )
+
+        self.config["policies"][category.id] = policy
+        self.schedule_all()
+
         embed = discord.Embed(
             title="Stale Alert",
             color=self.bot.main_color,
-            description=f"The time duration was set to {seconds} seconds.",
+            description=(
+                f"Tickets in the {category.name} category will now `{action}` "
+                f"after {seconds} seconds."
+            ),
+        )
+
+        await ctx.send(embed=embed)
+
+    @stale_policy.command(name="remove")
+    @checks.has_permissions(PermissionLevel.MODERATOR)
+    async def stale_policy_remove(
+        self,
+        ctx: commands.Context,
+        category: discord.CategoryChannel,
+        step: int = None,
+    ):
+        """Remove a step, or the whole escalation policy of a category."""
+
+        policy = self.config["policies"].get(category.id)
+
+        if not policy:
+            return await ctx.send("That category does not have a policy.")
+
+        if step is None:
+            policy = []
+        elif 1 <= step <= len(policy):
+            policy = policy[: step - 1] + policy[step:]
+        else:
+            return await ctx.send("That step could not be found.")
+
+        if policy:
+            await self.update_config(
+                {"$set": {f"policies.{category.id}": policy}}
+            )
+            self.config["policies"][category.id] = policy
+        else:
+            await self.update_config(
+                {"$unset": {f"policies.{category.id}": ""}}
+            )
+            del self.config["policies"][category.id]
+
+        self.schedule_all()
+
+        embed = discord.Embed(
+            title="Stale Alert",
+            color=self.bot.main_color,
+            description=(
+                f"The policy of the {category.name} category was updated."
+            ),
+        )
+
+        await ctx.send(embed=embed)
+
+    @stale_policy.command(name="list")
+    @checks.has_permissions(PermissionLevel.SUPPORTER)
+    async def stale_policy_list(self, ctx: commands.Context):
+        """View the escalation policy of each category."""
+
+        embed = discord.Embed(title="Stale Alert", color=self.bot.main_color)
+
+        if not self.config["policies"]:
+            embed.description = "There are no policies set up at the moment."
+
+        for category_id, policy in self.config["policies"].items():
+            category = self.bot.get_channel(category_id)
+
+            lines = []
+
+            for index, step in enumerate(policy, start=1):
+                line = f"{index}. After {step['after']} seconds: "
+                line += f"`{step['action']}`"
+
+                if step["role"]:
+                    line += f" <@&{step['role']}>"
+
+                if step["message"]:
+                    line += f" {step['message']}"
+
+                lines.append(line)
+
+            embed.add_field(
+                name=category.name if category else str(category_id),
+                value="\n".join(lines),
+                inline=False,
+            )
+
+        await ctx.send(embed=embed)
+
+    @stale.command(name="workers")
+    @checks.has_permissions(PermissionLevel.MODERATOR)
+    async def stale_workers(self, ctx: commands.Context, amount: int = None):
+        """Set the amount of stale alerts that are sent at the same time."""
+
+        if amount is None:
+            return await ctx.send_help(ctx.command)
+
+        if amount < 1:
+            raise commands.BadArgument(
+                "The amount of workers should be a strictly positive "
+                f"integer, not `{amount}`."
+            )
+
+        await self.update_config({"$set": {"workers": amount}})
+
+        self.config["workers"] = amount
+
+        embed = discord.Embed(
+            title="Stale Alert",
+            color=self.bot.main_color,
+            description=f"The amount of workers was set to {amount}.",
+        )
+
+        await ctx.send(embed=embed)
+
+    @stale.command(name="stats")
+    @checks.has_permissions(PermissionLevel.SUPPORTER)
+    async def stale_stats(self, ctx: commands.Context):
+        """View how much work the stale alerts are doing.
+
+        Other plugins can collect the same numbers by listening to the
+        `on_stale_alert_tick` event, which is dispatched after every
+        tick with the statistics of that tick.
+        """
+
+        embed = discord.Embed(title="Stale Alert", color=self.bot.main_color)
+
+        embed.add_field(
+            name="Index",
+            value=(
+                f"{len(self.activity)} thread(s) awaiting a response\n"
+                f"{len(self.deadlines)} scheduled deadline(s)"
+            ),
+            inline=False,
+        )
+
+        embed.add_field(
+            name="Totals",
+            value=(
+                f"{self.stats['ticks']} tick(s)\n"
+                f"{self.stats['threads_scanned']} thread(s) scanned\n"
+                f"{self.stats['messages_scanned']} message(s) scanned\n"
+                f"{self.stats['sent']} alert(s) sent\n"
+                f"{self.stats['skipped_ignored']} skipped, ignored\n"
+                f"{self.stats['skipped_missing_channel']} skipped, "
+                "missing channel\n"
+                f"{self.stats['skipped_missing_recipient']} skipped, "
+                "missing recipient\n"
+                f"{self.stats['skipped_failed']} failed"
+            ),
+            inline=False,
+        )
+
+        if self.last_tick is not None:
+            embed.add_field(
+                name="Last Tick",
+                value=(
+                    f"{self.last_tick['threads']} thread(s), "
+                    f"{self.last_tick['sent']} alert(s)\n"
+                    f"Evaluation: {self.last_tick['evaluation']:.3f}s\n"
+                    f"Total: {self.last_tick['duration']:.3f}s"
+                ),
+                inline=False,
+            )
+
+        if self.send_latencies:
+            latencies = list(self.send_latencies)
+
+            embed.add_field(
+                name="Send Latency",
+                value=(
+                    f"p50: {percentile(latencies, 0.5):.3f}s\n"
+                    f"p95: {percentile(latencies, 0.95):.3f}s\n"
+                    f"p99: {percentile(latencies, 0.99):.3f}s"
+                ),
+                inline=False,
+            )
+
+        if self.last_rebuild is not None:
+            embed.add_field(
+                name="Last Rebuild",
+                value=(
+                    f"{self.last_rebuild['threads']} thread(s) fetched in "
+                    f"{self.last_rebuild['fetch']:.3f}s"
+                ),
+                inline=False,
+            )
+
+        await ctx.send(embed=embed)
+
+    @stale.command(name="rebuild")
+    @checks.has_permissions(PermissionLevel.MODERATOR)
+    async def stale_rebuild(self, ctx: commands.Context):
+        """Rebuild the index of threads that are awaiting a response."""
+
+        await self.db.delete_many({"type": {"$in": ["activity", "index"]}})
+
+        self.activity = {}
+
+        await self.load_activity()
+
+        self.schedule_all()
+
+        s = "" if len(self.activity) == 1 else "s"
+
+        embed = discord.Embed(
+            title="Stale Alert",
+            color=self.bot.main_color,
+            description=(
+                f"Found {len(self.activity)} thread{s} awaiting a response."
+            ),
         )
 
         await ctx.send(embed=embed)
@@ -3,6 +3,19 @@ from discord.ext import commands
 
 from core import checks
 from core.models import PermissionLevel
+from core.paginator import EmbedPaginatorSession
+
+STATUSES = ("online", "idle", "dnd", "offline")
+
+STATUS_FMT = {
+    "online": "Online 🟢",
+    "idle": "Idle 🟡",
+    "dnd": "Do Not Disturb 🔴",
+    "offline": "Offline ⚪",
+}
+
+FIELD_LIMIT = 1024
+PAGE_LIMIT = 4000
 
 
 class Supporters(commands.Cog):
@@ -11,6 +24,228 @@ class Supporters(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
+        self.category_id = None
+        self.members = {status: set() for status in STATUSES}
+
+        self.pages = None
+
+    def build_index(self, category: discord.CategoryChannel):
+        """Function that indexes the members of the support team.
+
+        Unless everyone can read the main category, only members that
+        are targeted by one of its overwrites, or that have a role with
+        the administrator permission, are able to read it. When the
+        category does not deny reading to everyone, roles that allow
+        reading server-wide count as well. Only those members have their
+        permissions resolved. The index is grouped by status and kept up
+        to date by the listeners below.
+        """
+        guild = category.guild
+
+        self.category_id = category.id
+        self.members = {status: set() for status in STATUSES}
+        self.pages = None
+
+        if category.permissions_for(guild.default_role).read_messages:
+            candidates = guild.members
+        else:
+            candidates = {guild.owner_id: guild.owner} if guild.owner else {}
+
+            denied = (
+                category.overwrites_for(guild.default_role).read_messages
+                is False
+            )
+
+            roles = [
+                role
+                for role in guild.roles
+                if role.permissions.administrator
+                or category.overwrites_for(role).read_messages
+                or (role.permissions.read_messages and not denied)
+            ]
+
+            for role in roles:
+                candidates.update(
+                    (member.id, member) for member in role.members
+                )
+
+            for target in category.overwrites:
+                if isinstance(target, discord.Member):
+                    candidates[target.id] = target
+
+            candidates = candidates.values()
+
+        for member in candidates:
+            self.index_member(member)
+
+    def index_member(self, member: discord.Member):
+        """Add a member to the index, or remove it if it doesn't belong."""
+
+        self.discard_member(member.id)
+
+        category = self.bot.get_channel(self.category_id)
+
+        if category is None or member.bot:
+            return
+
+        if category.permissions_for(member).read_messages:
+            status = str(member.status)
+
+            if status not in self.members:
+                status = "offline"
+
+            self.members[status].add(member.id)
+            self.pages = None
+
+    def discard_member(self, member_id: int):
+        """Remove a member from the index."""
+
+        for members in self.members.values():
+            if member_id in members:
+                members.discard(member_id)
+                self.pages = None
+
+    def render_pages(self) -> list:
+        """Function that renders the index as a list of embeds.
+
+        Each status gets one or more fields, split so that no field
+        exceeds the length limit of Discord. Members are sorted by name,
+        so the pages stay the same between renders. Fields are spread
+        over as many embeds as needed. The pages are only rendered when
+        they're requested, and reused until the index changes.
+        """
+        if self.pages is not None:
+            return self.pages
+
+        category = self.bot.get_channel(self.category_id)
+
+        def sort_key(member_id: int) -> tuple:
+            member = category and category.guild.get_member(member_id)
+            name = member.display_name.lower() if member else ""
+
+            return name, member_id
+
+        fields = []
+
+        for status, member_ids in self.members.items():
+            value = ""
+
+            for member_id in sorted(member_ids, key=sort_key):
+                mention = f"<@{member_id}>"
+
+                if value and len(value) + len(mention) + 2 > FIELD_LIMIT:
+                    fields.append((STATUS_FMT[status], value))
+                    value = ""
+
+                value = f"{value}, {mention}" if value else mention
+
+            if value:
+                fields.append((STATUS_FMT[status], value))
+
+        def new_page() -> discord.Embed:
+            return discord.Embed(
+                title="Support Members", color=self.bot.main_color
+            )
+
+        pages = [new_page()]
+        length = 0
+
+        for name, value in fields:
+            if len(pages[-1].fields) == 25 or length + len(value) > PAGE_LIMIT:
+                pages.append(new_page())
+                length = 0
+
+            pages[-1].add_field(name=name, value=value)
+            length += len(name) + len(value)
+
+        self.pages = pages
+
+        return pages
+
+    def is_indexed_guild(self, guild: discord.Guild) -> bool:
+        """Check whether the index of a guild is being kept up to date."""
+
+        return (
+            self.category_id is not None
+            and guild == self.bot.modmail_guild
+        )
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        """Function that executes when a member joins a server."""
+
+        if self.is_indexed_guild(member.guild):
+            self.index_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        """Function that executes when a member leaves a server."""
+
+        if self.is_indexed_guild(member.guild):
+            self.discard_member(member.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(
+        self, before: discord.Member, after: discord.Member
+    ):
+        """Function that executes when the roles of a member change."""
+
+        if self.is_indexed_guild(after.guild) and before.roles != after.roles:
+            self.index_member(after)
+
+    @commands.Cog.listener()
+    async def on_presence_update(
+        self, before: discord.Member, after: discord.Member
+    ):
+        """Function that executes when the status of a member changes.
+
+        Members of the support team are moved to the group of their new
+        status.
+        """
+        if not self.is_indexed_guild(after.guild):
+            return
+
+        if before.status == after.status:
+            return
+
+        for members in self.members.values():
+            if after.id in members:
+                return self.index_member(after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(
+        self, before: discord.Role, after: discord.Role
+    ):
+        """Function that executes when a role is updated."""
+
+        if not self.is_indexed_guild(after.guild):
+            return
+
+        if before.permissions != after.permissions:
+            self.build_index(self.bot.get_channel(self.category_id))
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        """Function that executes when a role is deleted."""
+
+        if self.is_indexed_guild(role.guild):
+            self.build_index(self.bot.get_channel(self.category_id))
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(
+        self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+    ):
+        """Function that executes when a channel is updated.
+
+        The index is rebuilt when the overwrites of the main category
+        change.
+        """
+        if after.id != self.category_id:
+            return
+
+        if before.overwrites != after.overwrites:
+            self.build_index(after)
+
     @commands.command(aliases=["helpers", "supporters", "supportmembers"])
     @checks.has_permissions(PermissionLevel.REGULAR)
     async def support(self, ctx: commands.Context):
@@ -33,38 +268,15 @@ class Supporters(commands.Cog):
 
             return await ctx.send(embed=embed)
 
-        members = {
-            "online": [],
-            "idle": [],
-            "dnd": [],
-            "offline": [],
-        }
-
-        status_fmt = {
-            "online": "Online 🟢",
-            "idle": "Idle 🟡",
-            "dnd": "Do Not Disturb 🔴",
-            "offline": "Offline ⚪",
-        }
-
-        for member in self.bot.modmail_guild.members:
-            if (
-                category.permissions_for(member).read_messages
-                and not member.bot
-            ):
-                members[str(member.status)].append(member.mention)
-
-        embed = discord.Embed(
-            title="Support Members", color=self.bot.main_color
-        )
+        if category.id != self.category_id:
+            self.build_index(category)
 
-        for status, member_list in members.items():
-            if member_list:
-                embed.add_field(
-                    name=status_fmt[status], value=", ".join(member_list)
-                )
+        # the session adds page numbers to the footer of each embed
+        pages = [embed.copy() for embed in self.render_pages()]
+
+        session = EmbedPaginatorSession(ctx, *pages)
 
-        await ctx.send(embed=embed)
+        await session.run()
 
 
 async def setup(bot: commands.Bot):